@@ -5,9 +5,10 @@ A bias correction is applied to the data. If available, a bias map is used for
 this; otherwise, a mean value from metadata.
 
 Command line arguments:
-    * `meanfile`: location of an NPY stack of mean flat-field data. It is
-    assumed that for a meanfile "X_mean.npy", a standard deviation stack can be
-    found at "X_stds.npy" in the same folder.
+    * `meanfile`: location of an NPY stack of mean flat-field data, which may
+    be compressed (see `io.load_array`). It is assumed that for a meanfile
+    "X_mean.npy", a standard deviation stack can be found at "X_stds.npy" in
+    the same folder.
 """
 
 import numpy as np
@@ -28,15 +29,15 @@ print("Loaded metadata")
 
 # Load the data
 stdsfile = meanfile.parent / meanfile.name.replace("mean", "stds")
-mean_raw = np.load(meanfile)
-stds_raw = np.load(stdsfile)
+mean_raw = io.load_array(meanfile, mmap_mode=None)
+stds_raw = io.load_array(stdsfile, mmap_mode=None)
 print("Loaded data")
 
 # Bias correction
 mean_bias_corrected = calibrate.correct_bias(root, mean_raw)
 
 # Normalise the RGBG2 channels to a maximum of 1 each
-mean_normalised, stds_normalised = flat.normalise_RGBG2(mean_bias_corrected, stds_raw, camera.bayer_map)
+mean_normalised, stds_normalised = flat.normalise_RGBG2(mean_bias_corrected, stds_raw, camera.bayer_tile)
 print("Normalised data")
 
 # Calculate the signal-to-noise ratio (SNR) per pixel
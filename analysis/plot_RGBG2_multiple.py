@@ -26,7 +26,7 @@ colorbar_label = 40*" " + "Read noise (ADU)"
 cameras = [io.load_metadata(root) for root in roots]
 
 # Load the data
-data_all = [np.load(path) for path in files]
+data_all = [io.load_array(path, mmap_mode=None) for path in files]
 
 # Demosaick the data
 RGBGs_all = [camera.demosaick(data) for data, camera in zip(data_all, cameras)]
@@ -1,7 +1,7 @@
 """
 Create a bias map using the mean bias (zero-light, shortest-exposure images)
-images. Bias data for all ISOs are loaded, but the map is only saved for the
-lowest ISO.
+images. The map is only made for the lowest ISO, so only the data for that
+ISO are loaded.
 
 Command line arguments:
     * `folder`: folder containing NPY stacks of bias data taken at different
@@ -20,14 +20,14 @@ folder = io.path_from_input(argv)
 root = io.find_root_folder(folder)
 save_to = root/"calibration/bias.npy"
 
-# Load the mean stacks for each ISO value
-isos, means = io.load_means(folder, retrieve_value=io.split_iso)
-print(f"Loaded bias data for {len(isos)} ISO values from '{folder}'")
+# Load the mean stack for the lowest ISO value; only this file is read
+isos, means = io.load_means(folder, retrieve_value=io.split_iso, where="min")
+print(f"Loaded bias data for the lowest ISO value from '{folder}'")
 
-# Find the lowest ISO value in the data and select the respective bias map
-lowest_iso_index = isos.argmin()
-bias_map = means[lowest_iso_index]
+# Select the bias map at the lowest ISO value
+lowest_iso = isos[0]
+bias_map = means[0]
 
 # Save the bias map for calibration purposes
-np.save(save_to, bias_map)
-print(f"Saved bias map at ISO {isos[lowest_iso_index]} to '{save_to}'")
+save_to = io.save_array(save_to, bias_map)
+print(f"Saved bias map at ISO {lowest_iso} to '{save_to}'")
@@ -37,12 +37,12 @@ dark_current, bias_fit = dark.fit_dark_current_linear(times, means)
 print("Fitted dark current to each pixel")
 
 # Save the dark current map at this ISO
-np.save(save_to_ADU, dark_current)
+save_to_ADU = io.save_array(save_to_ADU, dark_current)
 print(f"Saved dark current map at ISO {ISO} to '{save_to_ADU}'")
 
 # ISO normalisation
 dark_current_normalised = calibrate.normalise_iso(root, ISO, dark_current)
 
 # Save the normalised dark current map
-np.save(save_to_normalised, dark_current_normalised)
+save_to_normalised = io.save_array(save_to_normalised, dark_current_normalised)
 print(f"Saved normalised dark current map to '{save_to_normalised}'")
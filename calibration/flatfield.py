@@ -5,9 +5,10 @@ A bias correction is applied to the data. If available, a bias map is used for
 this; otherwise, a mean value from metadata.
 
 Command line arguments:
-    * `meanfile`: location of an NPY stack of mean flat-field data. It is
-    assumed that for a meanfile "X_mean.npy", a standard deviation stack can be
-    found at "X_stds.npy" in the same folder.
+    * `meanfile`: location of an NPY stack of mean flat-field data, which may
+    be compressed (see `io.load_array`). It is assumed that for a meanfile
+    "X_mean.npy", a standard deviation stack can be found at "X_stds.npy" in
+    the same folder.
 
 To do:
     * Save map as simply `flat_field.npy` or with a label depending on user
@@ -42,15 +43,15 @@ print("Loaded metadata")
 
 # Load the data
 stdsfile = meanfile.parent / meanfile.name.replace("mean", "stds")
-mean = np.load(meanfile)
-stds = np.load(stdsfile)
+mean = io.load_array(meanfile, mmap_mode=None)
+stds = io.load_array(stdsfile, mmap_mode=None)
 print("Loaded data")
 
 # Bias correction
 mean = calibrate.correct_bias(root, mean)
 
 # Normalise the RGBG2 channels to a maximum of 1 each
-mean_normalised, stds_normalised = flat.normalise_RGBG2(mean, stds, camera.bayer_map)
+mean_normalised, stds_normalised = flat.normalise_RGBG2(mean, stds, camera.bayer_tile)
 print("Normalised data")
 
 # Convolve the flat-field data with a Gaussian kernel to remove small-scale variations
@@ -61,8 +62,8 @@ correction = 1 / flat_field_gauss
 correction_raw = 1 / mean_normalised
 
 # Save the correction factor maps
-np.save(save_to_correction, correction)
-np.save(save_to_correction_raw, correction_raw)
+save_to_correction = io.save_array(save_to_correction, correction)
+save_to_correction_raw = io.save_array(save_to_correction_raw, correction_raw)
 print(f"Saved the flat-field correction maps to '{save_to_correction}' (Gaussed) and '{save_to_correction_raw}' (raw)")
 
 # Only use the inner X pixels
@@ -89,8 +90,8 @@ for p, s in zip(parameters, standard_errors):
 correction_modelled = flat.apply_vignette_radial(correction.shape, parameters)
 
 # Save the moddelled correction map
-np.save(save_to_correction_modelled_intermediary, correction_modelled)
+save_to_correction_modelled_intermediary = io.save_array(save_to_correction_modelled_intermediary, correction_modelled)
 print(f"Saved the modelled flat-field correction map to '{save_to_correction_modelled_intermediary}'")
 if overwrite_calibration:
-    np.save(save_to_correction_modelled_calibration, correction_modelled)
+    save_to_correction_modelled_calibration = io.save_array(save_to_correction_modelled_calibration, correction_modelled)
     print(f"Saved the modelled flat-field correction map to '{save_to_correction_modelled_calibration}'")
@@ -62,12 +62,12 @@ for i in range(means.shape[1]):
         print(f"{100 * i / means.shape[1]:.1f}%", end=" ", flush=True)
 
 # Save the gain map
-np.save(save_to_original_map, gain_map)
+save_to_original_map = io.save_array(save_to_original_map, gain_map)
 print(f"Saved gain map to '{save_to_original_map}'")
 
 # Normalise the gain map to the minimum ISO value
 gain_map_normalised = calibrate.normalise_iso(root, ISO, gain_map)
 
 # Save the normalised gain map
-np.save(save_to_normalised_map, gain_map_normalised)
+save_to_normalised_map = io.save_array(save_to_normalised_map, gain_map_normalised)
 print(f"Saved normalised gain map to '{save_to_normalised_map}'")
@@ -22,8 +22,8 @@ root = io.find_root_folder(file)
 save_to = root/"metadata.json"
 
 # Get the data
-raw_file = io.load_raw_file(file)
-exif = io.load_exif(file)
+frame = io.RawFrame(file)
+exif = frame.exif
 print("Loaded data")
 
 # Get additional data from command line input from the user
@@ -37,7 +37,7 @@ exposure_max = input("What is the *highest* exposure time, in seconds, available
 print("")
 
 # Bit depth - find the maximum value and the corresponding bit depth
-maximum_value = raw_file.raw_image.max()
+maximum_value = frame.image.max()
 bit_depth_conversion = {255: 8, 511: 9, 1023: 10, 2047: 11, 4095: 12, 8191: 13,
                         16383: 14, 32767: 15, 65535: 16}
 try:
@@ -54,12 +54,13 @@ print("Device properties:", device)
 
 # Image proprties
 image = {
-        "shape": raw_file.raw_image.shape,
+        "shape": frame.image.shape,
         "raw_extension": file.suffix,
-        "bias": raw_file.black_level_per_channel,
-        "bayer_pattern": raw_file.raw_pattern.tolist(),
+        "bias": frame.black_levels,
+        "bayer_pattern": frame.bayer_pattern.tolist(),
         "bit_depth": bit_depth
         }
+frame.close()
 print("Image properties:", image)
 
 # Settings
@@ -1,7 +1,7 @@
 """
 Create a read noise map using the standard deviation bias (zero-light,
-shortest-exposure images) images. Bias data for all ISOs are loaded, but the
-map is only saved for the lowest ISO.
+shortest-exposure images) images. The map is only made for the lowest ISO, so
+only the data for that ISO are loaded.
 
 Command line arguments:
     * `folder`: folder containing NPY stacks of bias data taken at different
@@ -20,15 +20,15 @@ folder = io.path_from_input(argv)
 root = io.find_root_folder(folder)
 save_to = root/"calibration/readnoise.npy"
 
-# Load the standard deviation stacks for each ISO value
-isos, stds = io.load_stds(folder, retrieve_value=io.split_iso)
-print(f"Loaded bias data for {len(isos)} ISO values from '{folder}'")
+# Load the standard deviation stack for the lowest ISO value; only this file
+# is read
+isos, stds = io.load_stds(folder, retrieve_value=io.split_iso, where="min")
+print(f"Loaded bias data for the lowest ISO value from '{folder}'")
 
-# Find the lowest ISO value in the data and select the respective read noise
-# map
-lowest_iso_index = isos.argmin()
-readnoise_map = stds[lowest_iso_index]
+# Select the read noise map at the lowest ISO value
+lowest_iso = isos[0]
+readnoise_map = stds[0]
 
 # Save the read noise map
-np.save(save_to, readnoise_map)
-print(f"Saved read noise map at ISO {isos[lowest_iso_index]} to '{save_to}'")
+save_to = io.save_array(save_to, readnoise_map)
+print(f"Saved read noise map at ISO {lowest_iso} to '{save_to}'")
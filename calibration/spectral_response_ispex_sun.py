@@ -69,11 +69,12 @@ root = io.find_root_folder(file)
 coefficients = wavelength.load_coefficients(root/"intermediaries/spectral_response/ispex_wavelength_solution.npy")
 
 # Load the data
-img  = io.load_raw_file(file)
+with io.RawFrame(file) as frame:
+    image, colors = frame.image, frame.colors
 print("Loaded data")
 
 # Bias correction
-values = calibrate.correct_bias(root, img.raw_image.astype(np.float32))
+values = calibrate.correct_bias(root, image.astype(np.float32))
 
 # Flat-field correction - note that this clips the image
 values = calibrate.correct_flatfield(root, values)
@@ -91,12 +92,12 @@ y_thin = np.arange(ymin_thin, ymax_thin)
 y_thick = np.arange(ymin_thick, ymax_thick)
 
 image_thin   = values        [thin_slit ]
-colors_thin  = img.raw_colors[thin_slit ]
+colors_thin  = colors        [thin_slit ]
 RGBG_thin = raw.demosaick(colors_thin, image_thin)
 plot.show_RGBG(RGBG_thin)
 
 image_thick  = values        [thick_slit]
-colors_thick = img.raw_colors[thick_slit]
+colors_thick = colors        [thick_slit]
 RGBG_thick = raw.demosaick(colors_thick, image_thick)
 plot.show_RGBG(RGBG_thick)
 
@@ -105,9 +106,9 @@ above_thin  = np.s_[350:360, xmin:xmax]
 below_thick = np.s_[1400:1410, xmin:xmax]
 
 values_above = values[above_thin]
-colors_above = img.raw_colors[above_thin]
+colors_above = colors[above_thin]
 values_below = values[below_thick]
-colors_below = img.raw_colors[below_thick]
+colors_below = colors[below_thick]
 RGBG_above = raw.demosaick(colors_above, values_above)
 RGBG_below = raw.demosaick(colors_below, values_below)
 above = RGBG_above.mean(axis=1)
@@ -12,5 +12,5 @@ setup(
       author="Olivier Burggraaff",
       author_email="burggraaff@strw.leidenuniv.nl",
       packages=["spectacle"],
-      install_requires=["numpy", "scipy", "matplotlib", "rawpy", "exifread", "astropy"]
+      install_requires=["numpy", "scipy", "matplotlib", "rawpy", "exifread", "astropy", "pillow"]
 )
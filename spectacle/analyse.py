@@ -50,7 +50,8 @@ def plot_gauss_maps(data, bayer_data, kernel_width_RGBG2=5, **kwargs):
     Plot maps of the `data`, convolved with a Gaussian kernel. Both the
     mosaicked data and demosaicked RGBG2 data are convolved and plotted.
     The kernel width is `kernel_width_RGBG2` for the RGBG2 data and
-    `2*kernel_width_RGBG2` for the mosaicked data.
+    `2*kernel_width_RGBG2` for the mosaicked data. The data are demosaicked
+    according to `bayer_data`, a full Bayer map or its 2x2 tile.
 
     Any additional **kwargs are passed to both `plot.show_image` and
     `plot.show_image_RGBG2`.
@@ -82,7 +83,7 @@ def plot_gauss_maps(data, bayer_data, kernel_width_RGBG2=5, **kwargs):
 def plot_histogram_RGB(data, bayer_data, **kwargs):
     """
     Plot an RGB histogram of the `data`, demosaicked according to the
-    `bayer_data`.
+    `bayer_data` (a full Bayer map or its 2x2 tile).
 
     Any additional **kwargs are passed to `plot.histogram_RGB`.
     """
@@ -12,8 +12,8 @@ def load_bias_map(root, return_filename=False):
     If `return_filename` is True, also return the exact filename the bias map
     was retrieved from.
     """
-    filename = root/"calibration/bias.npy"
-    bias_map = np.load(filename)
+    filename = io.resolve_array_path(root/"calibration/bias.npy")
+    bias_map = io.load_array(filename, mmap_mode=None)
     if return_filename:
         return bias_map, filename
     else:
@@ -42,8 +42,8 @@ def load_readnoise_map(root, return_filename=False):
     If `return_filename` is True, also return the exact filename the metadata
     were retrieved from.
     """
-    filename = root/"calibration/readnoise.npy"
-    readnoise_map = np.load(filename)
+    filename = io.resolve_array_path(root/"calibration/readnoise.npy")
+    readnoise_map = io.load_array(filename, mmap_mode=None)
     if return_filename:
         return readnoise_map, filename
     else:
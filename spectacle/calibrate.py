@@ -3,10 +3,15 @@ Module for calibrating camera data based on calibration data.
 
 If you are only interested in calibrating your data, using previously generated
 calibrations, this is the module to use.
+
+Data can also be calibrated at reduced resolution: bin them with `bin_data`
+and pass the same `binning` factor to the correction functions, which then use
+calibration maps binned in the same way. Binned maps are cached in
+`root`/calibration/binned/ (see `load_binned_map`).
 """
 
 # Import other SPECTACLE submodules to use in functions
-from . import bias_readnoise, dark, flat, gain, io, iso, metadata, spectral
+from . import bias_readnoise, dark, flat, gain, io, iso, metadata, raw, spectral
 
 # Import functions from other SPECTACLE submodules which may be used in
 # calibration scripts, for simpler access
@@ -19,16 +24,98 @@ from .metadata import load_metadata
 from .raw import demosaick
 from .spectral import load_spectral_response, convert_RGBG2_to_RGB
 
-def correct_bias(root, *data):
+
+def bin_data(root, binning, *data):
+    """
+    Bin data into `binning` x `binning` superpixels within each Bayer channel
+    (see `raw.bin_bayer`), using the Bayer pattern of the camera in `root`.
+    The binned data can be calibrated by passing the same `binning` to the
+    correction functions in this module.
+    """
+    camera = metadata.load_metadata(root)
+
+    # Bin each given array
+    data_binned = [raw.bin_bayer(data_array, camera.bayer_tile, binning) for data_array in data]
+
+    # If only a single array was given, don't return a list
+    if len(data_binned) == 1:
+        data_binned = data_binned[0]
+
+    return data_binned
+
+
+def load_binned_map(root, loader, filename, binning=1, reciprocal=False):
+    """
+    Load the calibration map `root`/calibration/`filename`, binned into
+    `binning` x `binning` superpixels (see `bin_data`), using the function
+    `loader` (e.g. `gain.load_gain_map`) to load the full-resolution map.
+    If `reciprocal` is True, the reciprocal of the map is binned instead,
+    for maps that data are divided by (e.g. the gain map).
+
+    Binned maps are cached in `root`/calibration/binned/ and re-used until
+    the full-resolution map changes. Returns the binned map and the filename
+    it was retrieved from; if `binning` is 1, the full-resolution map is
+    loaded as usual.
+    """
+    if binning == 1:
+        return loader(root, return_filename=True)
+
+    # Use the cached binned map if it is newer than the original
+    original = io.resolve_array_path(root/"calibration"/filename)
+    cached = root/"calibration"/"binned"/f"{io.Path(filename).stem}_bin{binning}.npy"
+    try:
+        cached_existing = io.resolve_array_path(cached)
+        if cached_existing.stat().st_mtime >= original.stat().st_mtime:
+            return io.load_array(cached_existing, mmap_mode=None), cached_existing
+    except FileNotFoundError:
+        pass
+
+    # Bin the full-resolution map
+    full_map = loader(root)
+    camera = metadata.load_metadata(root)
+    if reciprocal:
+        binned_map = 1 / raw.bin_bayer(1 / full_map, camera.bayer_tile, binning)
+    else:
+        binned_map = raw.bin_bayer(full_map, camera.bayer_tile, binning)
+
+    # Cache the binned map; if that is not possible, simply use it
+    try:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        cached = io.save_array(cached, binned_map)
+    except OSError:
+        cached = original
+
+    return binned_map, cached
+
+
+def precompute_binned_maps(root, binning):
+    """
+    Bin all available calibration maps in `root` into `binning` x `binning`
+    superpixels and cache them (see `load_binned_map`), so binned data can
+    be calibrated without loading any full-resolution maps.
+    """
+    for loader, filename, reciprocal in [(bias_readnoise.load_bias_map, "bias.npy", False),
+                                         (bias_readnoise.load_readnoise_map, "readnoise.npy", False),
+                                         (dark.load_dark_current_map, "dark_current_normalised.npy", False),
+                                         (gain.load_gain_map, "gain.npy", True),
+                                         (flat.load_flat_field_correction_map, "flatfield_correction_modelled.npy", False)]:
+        try:
+            binned_map, origin = load_binned_map(root, loader, filename, binning, reciprocal=reciprocal)
+        except FileNotFoundError:
+            continue
+        print(f"Binned calibration map saved to '{origin}'")
+
+
+def correct_bias(root, *data, binning=1):
     """
     Perform a bias correction on data using a bias map from the calibration
-    folder.
+    folder. For binned data, pass the `binning` factor (see `bin_data`).
 
     To do:
         - ISO selection
     """
     try:
-        bias, origin = bias_readnoise.load_bias_map(root, return_filename=True)
+        bias, origin = load_binned_map(root, bias_readnoise.load_bias_map, "bias.npy", binning)
     except FileNotFoundError:
         bias, origin = bias_readnoise.load_bias_metadata(root, return_filename=True)
         print(f"Using bias value from metadata in '{origin}'")
@@ -45,16 +132,17 @@ def correct_bias(root, *data):
     return data_corrected
 
 
-def correct_dark_current(root, exposure_time, *data):
+def correct_dark_current(root, exposure_time, *data, binning=1):
     """
     Perform a dark current correction on data using a dark current map from
     `root`/calibration/dark_current_normalised.npy
+    For binned data, pass the `binning` factor (see `bin_data`).
 
     To do:
         - Easy way to parse exposure times in scripts
     """
     # Load dark current map
-    dark_current, origin = dark.load_dark_current_map(root, return_filename=True)
+    dark_current, origin = load_binned_map(root, dark.load_dark_current_map, "dark_current_normalised.npy", binning)
     print(f"Using dark current map from '{origin}'")
 
     # Correct each given array
@@ -88,13 +176,14 @@ def normalise_iso(root, iso_values, *data):
     return data_corrected
 
 
-def convert_to_photoelectrons(root, *data):
+def convert_to_photoelectrons(root, *data, binning=1):
     """
     Convert ISO-normalised data to photoelectrons using a normalised gain map
     (in normalised ADU per photoelectron) from `root`/calibration/gain.npy
+    For binned data, pass the `binning` factor (see `bin_data`).
     """
     # Load the gain map
-    gain_map, origin = gain.load_gain_map(root, return_filename=True)  # norm. ADU / e-
+    gain_map, origin = load_binned_map(root, gain.load_gain_map, "gain.npy", binning, reciprocal=True)  # norm. ADU / e-
     print(f"Using normalised gain map from '{origin}'")
 
     # Correct each given array
@@ -107,18 +196,23 @@ def convert_to_photoelectrons(root, *data):
     return data_converted
 
 
-def correct_flatfield(root, *data, **kwargs):
+def correct_flatfield(root, *data, binning=1, **kwargs):
     """
     Correction for flat-fielding using a flat-field correction map read from
     `root`/calibration/flatfield_correction_modelled.npy
+    For binned data, pass the `binning` factor (see `bin_data`).
 
     To do:
         - Choose between model and map (separate functions?)
     """
     # Load the correction map
-    correction_map, origin = flat.load_flat_field_correction_map(root, return_filename=True)
+    correction_map, origin = load_binned_map(root, flat.load_flat_field_correction_map, "flatfield_correction_modelled.npy", binning)
     print(f"Using flat-field map from '{origin}'")
 
+    # Scale the clipped borders to the binned data
+    if binning > 1:
+        kwargs.setdefault("borders", flat.binned_borders(binning))
+
     # Correct each given array
     data_corrected = [flat.correct_flatfield_from_map(correction_map, data_array, **kwargs) for data_array in data]
 
@@ -38,3 +38,7 @@ spectacle_folder = home_folder / "SPECTACLE_data"
 # folder containing results for inter-camera comparisons
 # note that results for individual cameras are stored in `spectacle_folder/camera/results/`
 results_folder = home_folder / "SPECTACLE_results"
+
+# lossless compression for calibration maps and stacks saved by SPECTACLE
+# None (uncompressed .npy files), "zlib" (fast), or "lzma" (smallest files)
+compression = None
@@ -4,6 +4,7 @@ a map.
 """
 
 import numpy as np
+from . import io
 
 def fit_dark_current_linear(exposure_times, data):
     """
@@ -33,8 +34,8 @@ def load_dark_current_map(root, return_filename=False):
     If `return_filename` is True, also return the exact filename the bias map
     was retrieved from.
     """
-    filename = root/"calibration/dark_current_normalised.npy"
-    dark_current_map = np.load(filename)
+    filename = io.resolve_array_path(root/"calibration/dark_current_normalised.npy")
+    dark_current_map = io.load_array(filename, mmap_mode=None)
     if return_filename:
         return dark_current_map, filename
     else:
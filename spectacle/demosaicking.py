@@ -0,0 +1,148 @@
+"""
+Code relating to full-resolution demosaicking: interpolating the two missing
+colours at every pixel of a Bayer mosaic to produce an RGB image with the
+same resolution as the sensor.
+
+Two methods are available: bilinear interpolation and the gradient-corrected
+linear interpolation of Malvar, He & Cutler (2004). Both are linear filters.
+Each colour at each position within the 2x2 Bayer tile is calculated only on
+its own sub-lattice, as a vectorised sum of shifted slices of the mosaic. The
+image is processed in bands of rows, with a halo of extra rows around each
+band, spread over multiple threads.
+"""
+
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+from . import raw
+
+# Interpolation kernels for each method. Each method has four kernels:
+#   * "cross": green at red and blue pixels
+#   * "horizontal": red/blue at green pixels, from a red/blue row
+#   * "vertical": red/blue at green pixels, from a red/blue column
+#   * "diagonal": red at blue pixels and vice versa
+kernels = {"bilinear": {"cross": np.array([[0, 1, 0],
+                                           [1, 0, 1],
+                                           [0, 1, 0]]) / 4,
+                        "horizontal": np.array([[0, 0, 0],
+                                                [1, 0, 1],
+                                                [0, 0, 0]]) / 2,
+                        "vertical": np.array([[0, 1, 0],
+                                              [0, 0, 0],
+                                              [0, 1, 0]]) / 2,
+                        "diagonal": np.array([[1, 0, 1],
+                                              [0, 0, 0],
+                                              [1, 0, 1]]) / 4},
+           "malvar": {"cross": np.array([[ 0,  0, -1,  0,  0],
+                                         [ 0,  0,  2,  0,  0],
+                                         [-1,  2,  4,  2, -1],
+                                         [ 0,  0,  2,  0,  0],
+                                         [ 0,  0, -1,  0,  0]]) / 8,
+                      "horizontal": np.array([[ 0,  0, 0.5,  0,  0],
+                                              [ 0, -1,   0, -1,  0],
+                                              [-1,  4,   5,  4, -1],
+                                              [ 0, -1,   0, -1,  0],
+                                              [ 0,  0, 0.5,  0,  0]]) / 8,
+                      "vertical": np.array([[  0,  0, -1,  0,   0],
+                                            [  0, -1,  4, -1,   0],
+                                            [0.5,  0,  5,  0, 0.5],
+                                            [  0, -1,  4, -1,   0],
+                                            [  0,  0, -1,  0,   0]]) / 8,
+                      "diagonal": np.array([[   0, 0, -1.5, 0,    0],
+                                            [   0, 2,    0, 2,    0],
+                                            [-1.5, 0,    6, 0, -1.5],
+                                            [   0, 2,    0, 2,    0],
+                                            [   0, 0, -1.5, 0,    0]]) / 8}}
+
+
+def _taps(kernel):
+    """
+    Convert a `kernel` into a list of (dy, dx, weight) for its non-zero
+    elements, with (dy, dx) relative to the centre of the kernel.
+    """
+    half = kernel.shape[0] // 2
+    return [(dy - half, dx - half, np.float32(kernel[dy, dx])) for dy, dx in zip(*np.nonzero(kernel))]
+
+
+def _correlate_sublattice(padded, taps, y0, x0, height, width, halo):
+    """
+    Correlate the padded mosaic `padded` with the kernel given by `taps`,
+    only at the pixels [y0::2, x0::2] of the `height` x `width` region inside
+    the `halo`.
+    """
+    result = None
+    for dy, dx, weight in taps:
+        shifted = padded[halo+y0+dy:halo+dy+height:2, halo+x0+dx:halo+dx+width:2]
+        if result is None:
+            result = weight * shifted
+            temporary = np.empty_like(result)
+        else:
+            # Multiply into a re-used buffer to avoid a new array per tap
+            np.multiply(shifted, weight, out=temporary)
+            result += temporary
+    return result
+
+
+def _interpolate_band(padded, RGB, start, stop, positions, taps, halo):
+    """
+    Interpolate the rows `start` to `stop` of the image, reading them and
+    their halo from the padded mosaic `padded` and writing into `RGB`.
+    """
+    band = padded[start:stop+2*halo]
+    band_RGB = RGB[start:stop]
+    height, width = band_RGB.shape[:2]
+
+    for (y0, x0), channels in positions:
+        for channel, kind in channels.items():
+            if kind == "raw":
+                values = band[halo+y0:halo+height:2, halo+x0:halo+width:2]
+            else:
+                values = _correlate_sublattice(band, taps[kind], y0, x0, height, width, halo)
+            band_RGB[y0::2, x0::2, channel] = values
+
+
+def interpolate(data, bayer_pattern, method="malvar", tile_rows=256, workers=None):
+    """
+    Demosaick the two-dimensional mosaicked `data` into a full-resolution RGB
+    image of shape (H, W, 3), in float32, using the Bayer pattern
+    `bayer_pattern` (a full Bayer map or its 2x2 tile, e.g.
+    `Camera.bayer_tile`).
+
+    `method` can be "bilinear" or "malvar" (gradient-corrected interpolation
+    after Malvar, He & Cutler). The image is processed in bands of
+    `tile_rows` rows by a pool of `workers` threads (default: one per CPU
+    core); each band also reads the rows around it that its kernels need.
+    The edges of the image are mirrored, which preserves the Bayer pattern.
+    """
+    try:
+        taps = {kind: _taps(kernel) for kind, kernel in kernels[method].items()}
+    except KeyError:
+        raise ValueError(f"Invalid demosaicking method `{method}` given; must be one of `{list(kernels)}`")
+
+    # Use all available cores if no number of workers was given
+    if workers is None:
+        workers = os.cpu_count()
+
+    # Position of the red and blue pixels in the Bayer tile; the green pixels
+    # are in the same row as one and the same column as the other
+    (ry, rx), (by, bx) = raw.bayer_offsets(bayer_pattern)[[0, 2]]
+    if ry == by or rx == bx:
+        raise ValueError(f"Bayer pattern `{np.asarray(bayer_pattern)[:2, :2].tolist()}` does not have red and blue pixels on a diagonal")
+    positions = [((ry, rx), {0: "raw", 1: "cross", 2: "diagonal"}),
+                 ((by, bx), {0: "diagonal", 1: "cross", 2: "raw"}),
+                 ((ry, bx), {0: "horizontal", 1: "raw", 2: "vertical"}),
+                 ((by, rx), {0: "vertical", 1: "raw", 2: "horizontal"})]
+
+    # Bands must start on an even row to keep the same Bayer pattern
+    tile_rows += tile_rows % 2
+    halo = max(kernel.shape[0] for kernel in kernels[method].values()) // 2
+    padded = np.pad(np.asarray(data, dtype=np.float32), halo, mode="reflect")
+    height, width = data.shape
+    RGB = np.empty((height, width, 3), dtype=np.float32)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(_interpolate_band, padded, RGB, start, min(start+tile_rows, height), positions, taps, halo) for start in range(0, height, tile_rows)]
+        for job in jobs:
+            job.result()  # re-raise any errors from the threads
+
+    return RGB
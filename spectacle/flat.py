@@ -4,7 +4,7 @@ Code relating to flat-fielding, such as fitting or applying a vignetting model.
 
 import numpy as np
 from .general import gaussMd, curve_fit, generate_XY
-from . import raw
+from . import raw, io
 
 parameter_labels = ["k0", "k1", "k2", "k3", "k4", "cx", "cy"]
 
@@ -28,6 +28,14 @@ def clip_data(data, borders=_clip_border):
     return data_with_nan
 
 
+def binned_borders(binning, borders=_clip_border):
+    """
+    Scale `borders` (as used in `clip_data`) to data that were binned into
+    `binning` x `binning` superpixels (see `raw.bin_bayer`).
+    """
+    return tuple(slice(border.start // binning, -(-border.stop // binning)) for border in borders)
+
+
 def vignette_radial(shape, XY, k0, k1, k2, k3, k4, cx_hat, cy_hat):
     """
     Vignetting function as defined in Adobe DNG standard 1.4.0.0
@@ -122,8 +130,8 @@ def load_flat_field_correction_map(root, return_filename=False):
     If `return_filename` is True, also return the exact filename the bias map
     was retrieved from.
     """
-    filename = root/"calibration/flatfield_correction_modelled.npy"
-    correction_map = np.load(filename)
+    filename = io.resolve_array_path(root/"calibration/flatfield_correction_modelled.npy")
+    correction_map = io.load_array(filename, mmap_mode=None)
     if return_filename:
         return correction_map, filename
     else:
@@ -132,7 +140,8 @@ def load_flat_field_correction_map(root, return_filename=False):
 
 def normalise_RGBG2(mean, stds, bayer_pattern):
     """
-    Normalise the Bayer RGBG2 channels to 1.
+    Normalise the Bayer RGBG2 channels to 1. `bayer_pattern` is a full Bayer
+    map or its 2x2 tile.
     """
     # Demosaick the data
     mean_RGBG = raw.demosaick(bayer_pattern, mean)
@@ -152,21 +161,21 @@ def normalise_RGBG2(mean, stds, bayer_pattern):
     stds_RGBG = stds_RGBG / normalisation_array
 
     # Re-mosaick the now-normalised flat-field data
-    mean_remosaicked = raw.put_together_from_colours(mean_RGBG, bayer_pattern)
-    stds_remosaicked = raw.put_together_from_colours(stds_RGBG, bayer_pattern)
+    mean_remosaicked = raw.put_together(mean_RGBG, bayer_pattern)
+    stds_remosaicked = raw.put_together(stds_RGBG, bayer_pattern)
 
     return mean_remosaicked, stds_remosaicked
 
 
-def correct_flatfield_from_map(flatfield, data, clip=False):
+def correct_flatfield_from_map(flatfield, data, clip=False, borders=_clip_border):
     """
     Apply a flat-field correction from a flat-field map `flatfield` to an
     array `data`.
 
-    If `clip`, clip the data (make the outer borders NaN).
+    If `clip`, clip the data (make the outer borders NaN) outside `borders`.
     """
     if clip:
-        data_to_correct = clip_data(data)
+        data_to_correct = clip_data(data, borders=borders)
     else:
         data_to_correct = data
 
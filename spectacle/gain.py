@@ -3,6 +3,7 @@ Code relating to gain calibration, such as loading gain maps.
 """
 
 import numpy as np
+from . import io
 
 def load_gain_map(root, return_filename=False):
     """
@@ -11,8 +12,8 @@ def load_gain_map(root, return_filename=False):
     If `return_filename` is True, also return the exact filename the bias map
     was retrieved from.
     """
-    filename = root/"calibration/gain.npy"
-    gain_map = np.load(filename)
+    filename = io.resolve_array_path(root/"calibration/gain.npy")
+    gain_map = io.load_array(filename, mmap_mode=None)
     if return_filename:
         return gain_map, filename
     else:
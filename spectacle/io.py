@@ -2,10 +2,19 @@ import rawpy
 import exifread
 import numpy as np
 import os
+import copy
+import json
+import hashlib
+import zipfile
+import weakref
+from io import BytesIO
 from pathlib import Path
-from matplotlib import pyplot as plt
-from .config import spectacle_folder, results_folder
-from .metadata import load_metadata
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from PIL import Image
+from .config import spectacle_folder, results_folder, compression as default_compression
+from .metadata import load_metadata, load_json, write_json
 
 def path_from_input(argv):
     """
@@ -25,28 +34,315 @@ def load_raw_file(filename):
     return img
 
 
-def load_raw_image(filename):
+class RawCache(object):
+    """
+    Class that represents an on-disk cache of decoded raw files. The image
+    data (`raw_image`) and Bayer colour data (`raw_colors`) of each raw file
+    are stored as .npy files, which are memory-mapped when loaded again, so
+    repeated passes over the same data do not need to decode them again.
+
+    Cache entries are keyed by the absolute path, size, and modification time
+    of the raw file, so changed files are decoded again. The total size of the
+    cache is capped at `max_size` bytes; when it is exceeded, the least
+    recently used entries are removed.
+    """
+    def __init__(self, folder, max_size=20e9):
+        """
+        Generate a RawCache storing its files in `folder` (created if it does
+        not exist yet), with a maximum total size of `max_size` bytes.
+        """
+        self.folder = Path(folder)
+        self.max_size = max_size
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self):
+        """
+        Output for `print(RawCache)`
+        """
+        return f"RawCache('{self.folder}', max_size={self.max_size:.3g})"
+
+    def _key(self, filename):
+        """
+        Generate the cache key for a raw file `filename`, based on its
+        absolute path, size, and modification time.
+        """
+        filename = Path(filename).absolute()
+        stat = filename.stat()
+        identity = f"{filename}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def _paths(self, key):
+        """
+        Paths of the image and colour data files for a cache key `key`.
+        """
+        return self.folder/f"{key}_image.npy", self.folder/f"{key}_colors.npy"
+
+    @staticmethod
+    def _save(path, array):
+        """
+        Save an `array` to `path` atomically, so other processes never see a
+        partially written file.
+        """
+        temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(temporary, "wb") as file:
+            np.save(file, array)
+        os.replace(temporary, path)
+
+    def load(self, filename):
+        """
+        Load the image and Bayer colour data of the raw file `filename` from
+        the cache, decoding and storing them first if necessary. The returned
+        arrays are read-only memory maps, except for newly decoded files,
+        which are returned as they are.
+
+        The cache may be shared by several processes at once, e.g. the
+        workers of `load_raw_image_multi`, so any file may be removed by
+        another process at any time; missing files are treated as evicted.
+        """
+        image_path, colors_path = self._paths(self._key(filename))
+
+        try:
+            image = np.load(image_path, mmap_mode="r")
+            colors = np.load(colors_path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            # Not in the cache (or incomplete): decode the file and store it
+            img = load_raw_file(filename)
+            colors = img.raw_colors.astype(np.uint8)
+            image = img.raw_image.astype(np.uint16)
+            img.close()
+            self._save(colors_path, colors)
+            self._save(image_path, image)
+            self._evict(keep=(image_path, colors_path))
+        else:
+            # Mark the entry as recently used, unless it was evicted since
+            try:
+                os.utime(image_path)
+            except FileNotFoundError:
+                pass
+
+        return image, colors
+
+    @staticmethod
+    def _stat(path):
+        """
+        Size and modification time of `path`, or None if it no longer exists
+        (e.g. because another process evicted it).
+        """
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def size(self):
+        """
+        Total size of the files in the cache, in bytes.
+        """
+        stats = [self._stat(path) for path in self.folder.glob("*.npy")]
+        return sum(stat[0] for stat in stats if stat is not None)
+
+    def _evict(self, keep=()):
+        """
+        Remove the least recently used cache entries until the total size of
+        the cache is below `max_size`. Files in `keep` are never removed.
+        """
+        # Files removed by another process in the meantime are skipped
+        stats = {path: self._stat(path) for path in self.folder.glob("*_image.npy")}
+        images = sorted((path for path, stat in stats.items() if stat is not None), key=lambda path: stats[path][1])
+        total = self.size()
+        for image_path in images:
+            if total <= self.max_size:
+                break
+            if image_path in keep:
+                continue
+            colors_path = image_path.with_name(image_path.name.replace("_image.npy", "_colors.npy"))
+            for path in (image_path, colors_path):
+                stat = self._stat(path)
+                if stat is None:
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                total -= stat[0]
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        for path in self.folder.glob("*.npy"):
+            path.unlink(missing_ok=True)
+
+
+def load_raw_image(filename, cache=None):
     """
     Load a raw file using rawpy's `imread` function. Return only the image
     data.
+
+    If a RawCache `cache` is given, the image data are read from (and if
+    necessary stored in) the cache instead.
     """
+    if cache is not None:
+        return cache.load(filename)[0]
     img = load_raw_file(filename)
     return img.raw_image
 
 
-def load_raw_colors(filename):
+def load_raw_colors(filename, cache=None):
     """
     Load a raw file using rawpy's `imread` function. Return only the Bayer
     colour data.
+
+    If a RawCache `cache` is given, the colour data are read from (and if
+    necessary stored in) the cache instead.
     """
+    if cache is not None:
+        return cache.load(filename)[1]
     img = load_raw_file(str(filename))
     return img.raw_colors
 
 
-def load_raw_image_multi(folder, pattern="*.dng"):
+class RawFrame(object):
+    """
+    Class that represents a single raw file, which is opened and decoded at
+    most once. The image data, Bayer colour data, black levels, white level,
+    and EXIF data are loaded lazily when first accessed and then kept.
+
+    The underlying rawpy object is released with `close()`, or automatically
+    when the RawFrame is used as a context manager:
+        with io.RawFrame(filename) as frame:
+            image = frame.image
+    Data that were already accessed remain available after closing; other
+    data cause the file to be opened again.
+    """
+    def __init__(self, filename):
+        """
+        Generate a RawFrame for the raw file `filename`. The file is not
+        opened until its data are accessed.
+        """
+        self.filename = Path(filename)
+        self._raw = None
+        self._image = None
+        self._colors = None
+        self._exif = None
+
+    def __repr__(self):
+        """
+        Output for `print(RawFrame)`
+        """
+        return f"RawFrame('{self.filename}')"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def raw(self):
+        """
+        The rawpy object for this file, opened on first access.
+        """
+        if self._raw is None:
+            self._raw = load_raw_file(self.filename)
+        return self._raw
+
+    def close(self):
+        """
+        Release the rawpy object for this file, if it is open.
+        """
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+
+    @property
+    def image(self):
+        """
+        Image data (`raw_image`) of this file.
+        """
+        if self._image is None:
+            self._image = self.raw.raw_image.copy()
+        return self._image
+
+    @property
+    def colors(self):
+        """
+        Bayer colour data (`raw_colors`) of this file.
+        """
+        if self._colors is None:
+            self._colors = self.raw.raw_colors.copy()
+        return self._colors
+
+    @property
+    def black_levels(self):
+        """
+        Black level per Bayer channel of this file.
+        """
+        return self.raw.black_level_per_channel
+
+    @property
+    def white_level(self):
+        """
+        White (saturation) level of this file.
+        """
+        return self.raw.white_level
+
+    @property
+    def bayer_pattern(self):
+        """
+        Bayer pattern (2x2 tile of Bayer channels) of this file.
+        """
+        return self.raw.raw_pattern
+
+    @property
+    def exif(self):
+        """
+        All EXIF data of this file, as loaded by `load_exif`.
+        """
+        if self._exif is None:
+            self._exif = load_exif(self.filename)
+        return self._exif
+
+
+def load_raw_image_and_colors(filename, cache=None):
+    """
+    Load a raw file using rawpy's `imread` function, or from a RawCache
+    `cache` if one is given. Return the image data and Bayer colour data.
+    """
+    if cache is not None:
+        return cache.load(filename)
+    img = load_raw_file(filename)
+    return img.raw_image, img.raw_colors
+
+
+def _load_raw_image_into_shared_memory(filename, memory_name, shape, index, cache=None):
+    """
+    Load the image data from a raw file `filename` and write them into element
+    `index` of an array with shape `shape` stored in the shared memory block
+    `memory_name`. Used by the worker processes in `load_raw_image_multi`.
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        arrs = np.ndarray(shape, dtype=np.uint16, buffer=memory.buf)
+        arrs[index] = load_raw_image(filename, cache=cache)
+        del arrs
+    finally:
+        memory.close()
+
+
+def load_raw_image_multi(folder, pattern="*.dng", workers=1, cache=None):
     """
     Load many raw files simultaneously and put their image data in a single
     array.
+
+    If `workers` is larger than 1, the files are decoded in parallel by a pool
+    of `workers` processes, which write their results directly into a shared
+    output array. This array is returned without copying; its shared memory
+    is released once the array and any views of it are deleted. If `workers`
+    is None, one process per CPU core is used.
+
+    If a RawCache `cache` is given, the data are read from the cache where
+    possible.
     """
 
     # Find all files in `folder` matching the given pattern `pattern`
@@ -54,42 +350,283 @@ def load_raw_image_multi(folder, pattern="*.dng"):
 
     # Load the first file to get the Bayer color information (`colors`)
     # and the shape of the images
-    file0 = load_raw_file(files[0])
-    colors = file0.raw_colors
+    image0, colors = load_raw_image_and_colors(files[0], cache=cache)
+
+    # Shape of the array that fits the image contained in each file
+    shape = (len(files), *image0.shape)
+
+    # Use all available cores if no number of workers was given
+    if workers is None:
+        workers = os.cpu_count()
+
+    # Serial decoding
+    if workers <= 1 or len(files) <= 2:
+        # Create an array to fit the image contained in each file
+        arrs = np.empty(shape, dtype=np.uint16)
+
+        # Include the already loaded first image in the array
+        arrs[0] = image0
+
+        # Include the image data from the other files in the array
+        for j, file in enumerate(files[1:], 1):
+            arrs[j] = load_raw_image(file, cache=cache)
+
+        return arrs, colors
+
+    # Parallel decoding: create a block of shared memory to fit the image
+    # contained in each file, which all worker processes can write into
+    memory = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.uint16).itemsize)
+    try:
+        arrs = np.ndarray(shape, dtype=np.uint16, buffer=memory.buf)
+
+        # Include the already loaded first image in the array
+        arrs[0] = image0
+
+        # Decode the other files in parallel, each directly into its own
+        # element of the shared array
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = [executor.submit(_load_raw_image_into_shared_memory, file, memory.name, shape, j, cache) for j, file in enumerate(files[1:], 1)]
+            for job in jobs:
+                job.result()  # re-raise any errors from the workers
+    except BaseException:
+        arrs = None
+        memory.close()
+        raise
+    finally:
+        # No other process needs to find the block any more; it stays
+        # mapped in this process until it is closed
+        memory.unlink()
+
+    # Return the shared array itself, without copying it; the block is
+    # released once the array and all views of it have been deleted
+    weakref.finalize(arrs, memory.close)
 
-    # Create an array to fit the image contained in each file
-    arrs = np.empty((len(files), *file0.raw_image.shape), dtype=np.uint16)
+    return arrs, colors
 
-    # Include the already loaded first image in the array
-    arrs[0] = file0.raw_image
 
-    # Include the image data from the other files in the array
-    for j, file in enumerate(files[1:], 1):
-        arrs[j] = load_raw_image(file)
+def prefetch(paths, loader, depth=2, **kwargs):
+    """
+    Iterate over `paths`, loading each with the function `loader` on a
+    background thread while the previous results are being processed. Up to
+    `depth` files are loaded ahead. Any additional **kwargs are passed to
+    `loader`.
 
-    return arrs, colors
+    Yields tuples (`path`, `loader(path)`), in the same order as `paths`.
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    queue = deque()
+    paths = iter(paths)
+    try:
+        # Start loading the first `depth` files
+        for path in paths:
+            queue.append((path, executor.submit(loader, path, **kwargs)))
+            if len(queue) >= depth:
+                break
+
+        # Yield the oldest result and start loading the next file
+        while queue:
+            path, job = queue.popleft()
+            for next_path in paths:
+                queue.append((next_path, executor.submit(loader, next_path, **kwargs)))
+                break
+            yield path, job.result()
+    finally:
+        # Stop loading if the caller stops iterating early
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_raw_frames(folder, pattern="*.dng", batch=None, cache=None):
+    """
+    Iterate over the raw files in `folder` matching the pattern `pattern`,
+    loading only one file (or one batch of files) at a time. This allows large
+    data sets to be reduced without holding all of their image data in memory.
+
+    If `batch` is None, yield a tuple (`path`, `image`, `colors`) for each
+    file, with `image` the image data and `colors` the Bayer colour data.
+
+    Otherwise, yield tuples (`paths`, `images`, `colors`), with `paths` a list
+    of up to `batch` files, `images` an array containing their image data, and
+    `colors` the Bayer colour data of the first file in the batch.
+
+    If a RawCache `cache` is given, the data are read from the cache where
+    possible. Single files are loaded ahead on a background thread (see
+    `prefetch`) while the previous ones are processed.
+    """
+    # Find all files in `folder` matching the given pattern `pattern`
+    files = sorted(folder.glob(pattern))
+
+    # Yield the files one by one
+    if batch is None:
+        for file, (image, colors) in prefetch(files, load_raw_image_and_colors, cache=cache):
+            yield file, image, colors
+        return
+
+    # Yield the files in batches of (at most) `batch` files
+    for start in range(0, len(files), batch):
+        paths = files[start:start+batch]
+
+        # Load the first file to get the Bayer color information (`colors`)
+        # and the shape of the images
+        image0, colors = load_raw_image_and_colors(paths[0], cache=cache)
+
+        # Create an array to fit the image contained in each file in the batch
+        images = np.empty((len(paths), *image0.shape), dtype=np.uint16)
+        images[0] = image0
+        for j, file in enumerate(paths[1:], 1):
+            images[j] = load_raw_image(file, cache=cache)
 
+        yield paths, images, colors
 
-def load_jpg_image(filename):
+
+def pack_raw_frames(folder, target, pattern="*.dng", cache=None):
+    """
+    Pack the raw files in `folder` matching the pattern `pattern` into a
+    frame archive in the folder `target`, which can be opened with
+    `FrameArchive`. The archive contains:
+        * `frames.npy`: the image data of all files, as an (N, H, W) uint16
+        array that can be memory-mapped.
+        * `colors.npy`: the Bayer colour data of the first file.
+        * `metadata.json`: the filename, ISO speed, exposure time, and
+        timestamp of each file (see `load_exif_summary`).
+    Files are decoded one at a time, so the archive does not need to fit in
+    memory. If a RawCache `cache` is given, it is used for decoding.
+
+    A ValueError is raised if `folder` contains no files matching `pattern`.
     """
-    Load a raw file using pyplot's `imread` function. Return only the image
+    files = sorted(folder.glob(pattern))
+    if len(files) == 0:
+        raise ValueError(f"No files matching `{pattern}` found in `{folder}`.")
+    target.mkdir(parents=True, exist_ok=True)
+
+    frames = None
+    metadata = []
+    for j, (file, image, colors) in enumerate(iter_raw_frames(folder, pattern, cache=cache)):
+        # Create the archive based on the first file
+        if frames is None:
+            frames = np.lib.format.open_memmap(target/"frames.npy", mode="w+", dtype=np.uint16, shape=(len(files), *image.shape))
+            np.save(target/"colors.npy", colors)
+
+        frames[j] = image
+        summary = load_exif_summary(file)
+        metadata.append({"filename": file.name, "iso": summary["iso"], "exposure_time": summary["exposure_time"], "timestamp": summary["timestamp"]})
+
+    frames.flush()
+    del frames
+    write_json(metadata, target/"metadata.json")
+
+    return target
+
+
+class FrameArchive(object):
+    """
+    Class that represents a frame archive made by `pack_raw_frames`. The
+    frames are memory-mapped, so single frames (`archive[j]`) and pixel time
+    series (`archive.time_series(y, x)`) are read-only views of the data on
+    disk, without copies.
+    """
+    def __init__(self, path):
+        """
+        Open the frame archive in the folder `path`.
+        """
+        self.path = Path(path)
+        self.frames = np.load(self.path/"frames.npy", mmap_mode="r")
+        self.colors = np.load(self.path/"colors.npy")
+        self.metadata = load_json(self.path/"metadata.json")
+
+    def __repr__(self):
+        """
+        Output for `print(FrameArchive)`
+        """
+        return f"FrameArchive('{self.path}', {len(self)} frames of {self.frames.shape[1:]})"
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        """
+        Frame(s) or any other part of the (N, H, W) frame array, e.g.
+        `archive[3]` or `archive[:, 100:200, 100:200]`.
+        """
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def time_series(self, y, x):
+        """
+        Values of the pixel(s) at (`y`, `x`) in every frame.
+        """
+        return self.frames[:, y, x]
+
+    @property
+    def filenames(self):
+        """
+        Filenames of the frames.
+        """
+        return [entry["filename"] for entry in self.metadata]
+
+    @property
+    def isos(self):
+        """
+        ISO speed of each frame.
+        """
+        return np.array([entry["iso"] for entry in self.metadata])
+
+    @property
+    def exposure_times(self):
+        """
+        Exposure time of each frame, in seconds.
+        """
+        return np.array([entry["exposure_time"] for entry in self.metadata])
+
+    @property
+    def timestamps(self):
+        """
+        Timestamp of each frame.
+        """
+        return [entry["timestamp"] for entry in self.metadata]
+
+
+def load_jpg_image(filename, selection=np.s_[:], scale=1):
+    """
+    Load a JPEG file using PIL's `Image.open` function. Return only the image
     data.
+
+    If `scale` is 2, 4, or 8, the image is decoded at reduced resolution
+    (1/`scale` along each axis) by the JPEG decoder itself, which is much
+    faster than decoding the full image. Only return array elements included
+    in `selection` (default: all), which refers to the (reduced-resolution)
+    decoded image.
     """
-    img = plt.imread(filename)
-    return img
+    if scale not in (1, 2, 4, 8):
+        raise ValueError(f"Invalid JPEG scale `{scale}` given; must be one of 1, 2, 4, 8")
+
+    with Image.open(filename) as img:
+        # Let the decoder reduce the resolution while decoding
+        if scale > 1:
+            img.draft(img.mode, (img.width//scale, img.height//scale))
+        img_array = np.asarray(img)[selection]
 
+    return img_array
 
-def load_jpg_multi(folder, pattern="*.jp*g"):
+
+def load_jpg_multi(folder, pattern="*.jp*g", selection=np.s_[:], scale=1, workers=None):
     """
     Load many jpg files simultaneously and put their image data in a single
     array.
+
+    The files are decoded in parallel by a pool of `workers` threads, each
+    writing directly into the output array. If `workers` is None, one thread
+    per CPU core is used. `selection` and `scale` are passed to
+    `load_jpg_image` to load only part of each image, or load each image at
+    reduced resolution.
     """
 
     # Find all files in `folder` matching the given pattern `pattern`
     files = list(folder.glob(pattern))
 
     # Load the first file to get the shape of the images
-    img0 = load_jpg_image(files[0])
+    img0 = load_jpg_image(files[0], selection=selection, scale=scale)
 
     # Create an array to fit the image contained in each file
     arrs = np.empty((len(files), *img0.shape), dtype=np.uint8)
@@ -97,9 +634,18 @@ def load_jpg_multi(folder, pattern="*.jp*g"):
     # Include the already loaded first image in the array
     arrs[0] = img0
 
+    # Use all available cores if no number of workers was given
+    if workers is None:
+        workers = os.cpu_count()
+
     # Include the image data from the other files in the array
-    for j, file in enumerate(files[1:], 1):
-        arrs[j] = load_jpg_image(file)
+    def _load_into_array(j, file):
+        arrs[j] = load_jpg_image(file, selection=selection, scale=scale)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(_load_into_array, j, file) for j, file in enumerate(files[1:], 1)]
+        for job in jobs:
+            job.result()  # re-raise any errors from the threads
 
     return arrs
 
@@ -114,6 +660,88 @@ def load_exif(filename):
     return exif
 
 
+# EXIF tags read into the EXIF index, and the keys they are stored under
+exif_index_tags = {"iso": "EXIF ISOSpeedRatings",
+                   "exposure_time": "EXIF ExposureTime",
+                   "timestamp": "EXIF DateTimeOriginal",
+                   "make": "Image Make",
+                   "model": "Image Model"}
+
+
+def load_exif_summary(filename):
+    """
+    Load only the EXIF tags listed in `exif_index_tags` (ISO speed, exposure
+    time, timestamp, make, and model) from an image. MakerNotes and
+    thumbnails are skipped and parsing of the EXIF IFD stops after the
+    timestamp, which makes this much faster than `load_exif`.
+
+    Return a dictionary with the keys in `exif_index_tags`. Tags that are
+    not present are None.
+    """
+    with open(filename, "rb") as f:
+        exif = exifread.process_file(f, stop_tag="DateTimeOriginal", details=False, extract_thumbnail=False)
+
+    summary = {key: (exif[tag].printable if tag in exif else None) for key, tag in exif_index_tags.items()}
+
+    # Convert the ISO speed and exposure time to numbers
+    if summary["iso"] is not None:
+        summary["iso"] = int(exif[exif_index_tags["iso"]].values[0])
+    if summary["exposure_time"] is not None:
+        exposure_time = exif[exif_index_tags["exposure_time"]].values[0]
+        summary["exposure_time"] = exposure_time.num / exposure_time.den
+
+    return summary
+
+
+def load_exif_index(folder, pattern="*.dng", workers=8, use_index=True):
+    """
+    Load the EXIF summaries (see `load_exif_summary`) of all files in
+    `folder` matching the pattern `pattern`, parsing them in a pool of
+    `workers` threads.
+
+    If `use_index` is True, the summaries are stored in an index file
+    (`folder`/exif_index.json). Only files that are new or whose modification
+    time or size changed since the index was written are parsed again.
+
+    Return a dictionary with the filename of each file as keys and its EXIF
+    summary as values.
+    """
+    index_path = folder/"exif_index.json"
+
+    # Read the existing index, if there is one
+    try:
+        index = load_json(index_path) if use_index else {}
+    except (OSError, ValueError):
+        index = {}
+
+    # Find the files that need to be (re-)parsed
+    files = sorted(folder.glob(pattern))
+    stats = {file.name: file.stat() for file in files}
+    outdated = [file for file in files if file.name not in index or index[file.name]["mtime"] != stats[file.name].st_mtime or index[file.name]["size"] != stats[file.name].st_size]
+
+    # Parse the outdated files in parallel
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        summaries = executor.map(load_exif_summary, outdated)
+        for file, summary in zip(outdated, summaries):
+            index[file.name] = {"mtime": stats[file.name].st_mtime, "size": stats[file.name].st_size, **summary}
+
+    # Remove files that no longer exist
+    removed = [name for name in index if name not in stats and not (folder/name).exists()]
+    for name in removed:
+        del index[name]
+
+    # Write the index again if anything changed
+    if use_index and (outdated or removed):
+        try:
+            write_json(index, index_path)
+        except OSError:
+            pass  # e.g. read-only folders; the index is still returned
+
+    # Return only the EXIF summaries, not the file information
+    summaries = {name: {key: index[name][key] for key in exif_index_tags} for name in stats}
+    return summaries
+
+
 def absolute_filename(file):
     """
     Return the absolute filename of a given Path object `file`.
@@ -121,27 +749,278 @@ def absolute_filename(file):
     return file.absolute()
 
 
+# Lossless codecs available for compressed arrays
+compression_codecs = {"zlib": zipfile.ZIP_DEFLATED, "lzma": zipfile.ZIP_LZMA}
+
+
+def _compressed_path(filename):
+    """
+    Path of the compressed counterpart (.npz) of a .npy file `filename`.
+    """
+    return Path(filename).with_suffix(".npz")
+
+
+def save_array(filename, array, compression=default_compression, chunk_rows=256):
+    """
+    Save an `array` to `filename` (a .npy file).
+
+    If `compression` is None (default: `compression` in the SPECTACLE config
+    file), a normal .npy file is written. Otherwise, the array is compressed
+    losslessly with the given codec ("zlib" or "lzma") and saved to a .npz
+    file with the same name instead. The array is split into chunks of
+    `chunk_rows` rows along its first axis, each compressed separately, so
+    parts of the array can be read without decompressing all of it. Before
+    compression, the bytes in each chunk are shuffled (all first bytes of
+    each element, then all second bytes, etc.), which makes smooth data such
+    as bias or dark current maps compress much better.
+
+    Once the array has been written, any copy of it in the other form is
+    removed, so an older array cannot shadow the new one (see
+    `resolve_array_path`).
+
+    Return the path of the file that was written.
+    """
+    if compression is None:
+        np.save(filename, array)
+        _compressed_path(filename).unlink(missing_ok=True)
+        return Path(filename)
+
+    array = np.ascontiguousarray(array)
+    filename = _compressed_path(filename)
+    header = {"shape": list(array.shape), "dtype": array.dtype.str, "chunk_rows": chunk_rows, "shuffle": True}
+
+    with zipfile.ZipFile(filename, mode="w", compression=compression_codecs[compression]) as file:
+        file.writestr("header.json", json.dumps(header))
+        for i, start in enumerate(range(0, max(len(array), 1), chunk_rows)):
+            chunk = array[start:start+chunk_rows]
+            shuffled = chunk.view(np.uint8).reshape(-1, array.dtype.itemsize).T
+            buffer = BytesIO()
+            np.lib.format.write_array(buffer, np.ascontiguousarray(shuffled))
+            file.writestr(f"chunk_{i}.npy", buffer.getvalue())
+
+    filename.with_suffix(".npy").unlink(missing_ok=True)
+    return filename
+
+
+def _read_compressed_header(file):
+    """
+    Read the header of an open compressed array file `file`.
+    """
+    header = json.loads(file.read("header.json"))
+    return tuple(header["shape"]), np.dtype(header["dtype"]), header["chunk_rows"]
+
+
+def _load_compressed(filename, selection=np.s_[:]):
+    """
+    Load the elements included in `selection` from a compressed array saved
+    by `save_array`. If the first element of `selection` is an integer or a
+    slice, only the chunks containing the selected rows are decompressed.
+    """
+    with zipfile.ZipFile(filename) as file:
+        shape, dtype, chunk_rows = _read_compressed_header(file)
+
+        # Find which rows are needed, if this can be determined
+        first = selection[0] if isinstance(selection, tuple) and len(selection) > 0 else selection
+        if isinstance(first, (int, np.integer)):
+            start = first % shape[0]
+            stop = start + 1
+            remaining = np.s_[start-(start//chunk_rows)*chunk_rows]
+        elif isinstance(first, slice) and (first.step is None or first.step > 0):
+            start, stop, step = first.indices(shape[0])
+            stop = max(start, stop)
+            remaining = np.s_[start-(start//chunk_rows)*chunk_rows:stop-(start//chunk_rows)*chunk_rows:step]
+        else:
+            start, stop, remaining = 0, shape[0], first
+
+        # Decompress only the chunks that contain the needed rows
+        chunks = []
+        for i in range(start//chunk_rows, -(-stop//chunk_rows)):
+            rows = min(chunk_rows, shape[0] - i*chunk_rows)
+            shuffled = np.lib.format.read_array(BytesIO(file.read(f"chunk_{i}.npy")))
+            chunks.append(shuffled.T.copy().view(dtype).reshape(rows, *shape[1:]))
+
+    data = np.concatenate(chunks) if chunks else np.empty((0, *shape[1:]), dtype=dtype)
+
+    # Apply the rest of the selection to the decompressed rows
+    if isinstance(selection, tuple):
+        return data[(remaining, *selection[1:])]
+    else:
+        return data[remaining]
+
+
+def resolve_array_path(filename):
+    """
+    Find the file in which the array meant for `filename` (a .npy file) is
+    stored: `filename` itself, or its compressed (.npz) counterpart. If
+    neither exists, a FileNotFoundError is raised.
+    """
+    filename = Path(filename)
+    if filename.suffix == ".npy" and not filename.exists() and _compressed_path(filename).exists():
+        return _compressed_path(filename)
+    if not filename.exists():
+        raise FileNotFoundError(f"No such file: '{filename}'")
+    return filename
+
+
+def load_array(filename, selection=np.s_[:], mmap_mode="r"):
+    """
+    Load the elements included in `selection` (default: all) from the array
+    saved at `filename`, which may be a .npy file or a compressed array saved
+    by `save_array`. Compressed arrays are found automatically if `filename`
+    refers to the .npy file.
+
+    .npy files are opened with `numpy.load` using the given `mmap_mode`
+    (default: "r", read-only memory map), so only the selected elements are
+    read from disk.
+    """
+    filename = resolve_array_path(filename)
+    if filename.suffix == ".npz":
+        return _load_compressed(filename, selection)
+    else:
+        return np.load(filename, mmap_mode=mmap_mode)[selection]
+
+
+def find_arrays(folder, pattern):
+    """
+    Find the arrays in `folder` following the pattern `pattern` (e.g.
+    `*_mean.npy`), including arrays stored in compressed form. If an array
+    exists in both forms, only the .npy file is returned.
+    """
+    files = set(folder.glob(pattern))
+    if pattern.endswith(".npy"):
+        compressed = folder.glob(pattern[:-len(".npy")] + ".npz")
+        files |= {file for file in compressed if not file.with_suffix(".npy").exists()}
+    return sorted(files)
+
+
+def read_npy_header(filename):
+    """
+    Read the shape and data type of the array in a .npy file `filename`, or a
+    compressed array saved by `save_array`, without loading its contents.
+    """
+    filename = resolve_array_path(filename)
+    if filename.suffix == ".npz":
+        with zipfile.ZipFile(filename) as file:
+            shape, dtype, chunk_rows = _read_compressed_header(file)
+        return shape, dtype
+
+    array = np.load(filename, mmap_mode="r")
+    shape, dtype = array.shape, array.dtype
+    del array
+    return shape, dtype
+
+
 def expected_array_size(folder, pattern):
     """
     Find the required array size when loading files from `folder` that follow
     the pattern `pattern`, e.g. all .DNG files.
+
+    The file is memory-mapped, so only its header is read from disk.
     """
-    files = sorted(folder.glob(pattern))
-    array = np.load(files[0])
-    return np.array(array.shape)
+    files = find_arrays(folder, pattern)
+    shape, dtype = read_npy_header(files[0])
+    return np.array(shape)
+
+
+def stack_npy_files(files, selection=np.s_[:], mmap_mode="r", dtype=None, save_to=None, workers=8):
+    """
+    Load the .npy files `files` into a single array, with one element per
+    file. Only array elements included in `selection` (default: all) are
+    loaded.
+
+    The output array is allocated once, based on the .npy header of the first
+    file, and filled by a pool of `workers` threads, so no intermediate copies
+    are made. The output has the data type `dtype` (default: that of the
+    files), e.g. np.float32 to halve the memory needed for float64 data. If
+    `save_to` is given, the output is a memory-mapped .npy file at that path
+    instead of an array in memory.
+
+    The files are opened with `load_array` using the given `mmap_mode`, so
+    compressed arrays can be loaded too.
+    """
+    if len(files) == 0:
+        raise ValueError("No files to load.")
+
+    # Find the shape and data type of the output from the first file; for
+    # memory-mapped files, this does not read their contents yet
+    array0 = load_array(files[0], selection=selection, mmap_mode="r")
+    shape = (len(files), *array0.shape)
+    dtype = array0.dtype if dtype is None else np.dtype(dtype)
+
+    # Allocate the output array, in memory or as a memory-mapped file
+    if save_to is None:
+        stacked = np.empty(shape, dtype=dtype)
+    else:
+        stacked = np.lib.format.open_memmap(save_to, mode="w+", dtype=dtype, shape=shape)
+
+    # Fill the output array in parallel, one file per thread
+    def _load_into_array(j, file):
+        stacked[j] = load_array(file, selection=selection, mmap_mode=mmap_mode)
+
+    stacked[0] = array0
+    del array0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(_load_into_array, j, file) for j, file in enumerate(files[1:], 1)]
+        for job in jobs:
+            job.result()  # re-raise any errors from the threads
+
+    return stacked
 
 
-def load_npy(folder, pattern, retrieve_value=absolute_filename, selection=np.s_[:], **kwargs):
+def select_nearest(target):
+    """
+    Generate a selector for `load_npy` that matches the file(s) whose value is
+    nearest to `target`.
+    """
+    def selector(values):
+        distance = np.abs(values - target)
+        return distance == distance.min()
+    return selector
+
+
+# Selectors for `load_npy` that can be given by name
+value_selectors = {"min": lambda values: values == values.min(),
+                   "max": lambda values: values == values.max()}
+
+
+def load_npy(folder, pattern, retrieve_value=absolute_filename, selection=np.s_[:], mmap_mode="r", where=None, dtype=None, save_to=None, workers=8, **kwargs):
     """
     Load a series of .npy (NumPy binary) files from `folder` following a
     pattern `pattern`. Returns the contents of the .npy files as well as a
     list of values based on their parsing their filenames with a function
     given in the `retrieve_value` keyword. Only return array elements included
     in `selection` (default: all).
+
+    The files are opened with `numpy.load` using the given `mmap_mode`
+    (default: "r", read-only memory map), so `selection` is applied before
+    the data are read and only the selected elements are loaded from disk.
+    Use `mmap_mode=None` to read each file into memory in full instead.
+
+    If `where` is given, only files whose values match it are opened. `where`
+    can be a function that takes the array of values and returns a boolean
+    array, e.g. `lambda isos: isos >= 200`, or the name of a selector in
+    `value_selectors` ("min" or "max"). Use `select_nearest(x)` to select the
+    file(s) with the value nearest to `x`.
+
+    Arrays stored in compressed form (see `save_array`) are found and loaded
+    transparently.
+
+    The files are loaded into a single pre-allocated array by
+    `stack_npy_files`, to which `dtype`, `save_to`, and `workers` are passed.
     """
-    files = sorted(folder.glob(pattern))
-    stacked = np.stack([np.load(f)[selection] for f in files])
+    files = find_arrays(folder, pattern)
     values = np.array([retrieve_value(f, **kwargs) for f in files])
+
+    # Filter the files on their values before opening any of them
+    if where is not None:
+        if isinstance(where, str):
+            where = value_selectors[where]
+        matches = np.asarray(where(values), dtype=bool)
+        files = [f for f, match in zip(files, matches) if match]
+        values = values[matches]
+
+    stacked = stack_npy_files(files, selection=selection, mmap_mode=mmap_mode, dtype=dtype, save_to=save_to, workers=workers)
     return values, stacked
 
 
@@ -170,8 +1049,15 @@ def split_exposure_time(path):
     times, e.g. 1/1000 seconds.
     For a filename `x.z`, the returned value is `float(x)`.
     For a filename `x_y.z`, the returned value is `float(x/y)`.
+    A leading "t" and a trailing stack kind (e.g. `_mean` or `_saturated`, see
+    `StackCatalog.kinds`) are ignored.
     """
-    without_letters = path.stem.strip("t_jmeansd")  # strip underscores, leading t, trailing "mean"/"stds"
+    stem = path.stem
+    for kind in StackCatalog.kinds:
+        if stem.endswith(f"_{kind}"):
+            stem = stem[:-len(kind)-1]
+            break
+    without_letters = stem.lstrip("t").strip("_")  # strip leading t and underscores
     if "_" in without_letters:
         numerator, denominator = without_letters.split("_")
         time = float(numerator)/float(denominator)
@@ -234,6 +1120,165 @@ def load_jstds(folder, **kwargs):
     return values, stds
 
 
+def load_saturated(folder, **kwargs):
+    """
+    Quickly load the number of saturated frames per pixel for all RAW image
+    stacks in a given folder.
+
+    Load the files in `folder` that follow the pattern `*_saturated.npy`.
+    Any additional **kwargs are passed to `load_npy`.
+    """
+    values, saturated = load_npy(folder, "*_saturated.npy", **kwargs)
+    return values, saturated
+
+
+def load_outliers(folder, **kwargs):
+    """
+    Quickly load the number of outlying frames per pixel for all RAW image
+    stacks in a given folder.
+
+    Load the files in `folder` that follow the pattern `*_outliers.npy`.
+    Any additional **kwargs are passed to `load_npy`.
+    """
+    values, outliers = load_npy(folder, "*_outliers.npy", **kwargs)
+    return values, outliers
+
+
+class StackCatalog(object):
+    """
+    Class that provides an indexed view of the NPY stacks in a folder. The
+    folder is scanned once, recording for each condition (e.g. `iso100`) the
+    value parsed from its filename, the paths of its stacks (mean, stds,
+    jmean, jstds) and flag counts (saturated, outliers), and the shape and
+    data type of its arrays (read from the .npy headers only). Stacks are
+    only loaded when requested.
+
+    The file information is cached in a sidecar index file in the folder,
+    which is refreshed for any file whose modification time or size changed.
+    """
+    # Properties of a single condition in the catalog
+    Entry = namedtuple("Entry", ["name", "value", "files", "shape", "dtype"])
+
+    # Kinds of stack that may exist for each condition
+    kinds = ("mean", "stds", "jmean", "jstds", "saturated", "outliers")
+
+    # Name of the sidecar index file
+    index_filename = "stack_catalog.json"
+
+    def __init__(self, folder, retrieve_value=absolute_filename, use_index=True, **kwargs):
+        """
+        Generate a StackCatalog for the stacks in `folder`. The value for each
+        condition is parsed from its filename using the function
+        `retrieve_value`, to which any additional **kwargs are passed.
+
+        If `use_index` is True, file information is read from and written to
+        the sidecar index file.
+        """
+        self.folder = folder
+        self.index_path = folder/self.index_filename
+
+        # Read the file information, re-using the index where possible
+        file_info = self._scan(use_index)
+
+        # Group the files into conditions
+        grouped = {}
+        for filename in sorted(file_info):
+            name, kind = filename[:-len(".npy")].rsplit("_", 1)
+            grouped.setdefault(name, {})[kind] = folder/filename
+
+        entries = []
+        for name, files in grouped.items():
+            first_file = files[next(kind for kind in self.kinds if kind in files)]
+            info = file_info[first_file.name]
+            value = retrieve_value(first_file, **kwargs)
+            entries.append(self.Entry(name, value, files, tuple(info["shape"]), np.dtype(info["dtype"])))
+
+        self.entries = entries
+
+    def __repr__(self):
+        """
+        Output for `print(StackCatalog)`
+        """
+        return f"StackCatalog('{self.folder}', {len(self)} conditions)"
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def _scan(self, use_index):
+        """
+        Find the stacks in the folder and read their shapes and data types.
+        Information for files that are unchanged since the index was last
+        written is taken from the index instead.
+        """
+        # Read the existing index, if there is one
+        try:
+            index = load_json(self.index_path) if use_index else {}
+        except (OSError, ValueError):
+            index = {}
+
+        file_info = {}
+        changed = False
+        for kind in self.kinds:
+            for file in find_arrays(self.folder, f"*_{kind}.npy"):
+                stat = file.stat()
+                info = index.get(file.name)
+                if info is None or info["mtime"] != stat.st_mtime or info["size"] != stat.st_size:
+                    shape, dtype = read_npy_header(file)
+                    info = {"mtime": stat.st_mtime, "size": stat.st_size, "shape": list(shape), "dtype": dtype.str}
+                    changed = True
+                file_info[file.name] = info
+
+        # Write the index again if anything was added, changed, or removed
+        if use_index and (changed or file_info.keys() != index.keys()):
+            try:
+                write_json(file_info, self.index_path)
+            except OSError:
+                pass  # e.g. read-only folders; the catalog still works
+
+        return file_info
+
+    @property
+    def values(self):
+        """
+        Array of the parsed values of all conditions in the catalog.
+        """
+        return np.array([entry.value for entry in self.entries])
+
+    def select(self, predicate):
+        """
+        Return a new StackCatalog containing only the conditions whose value
+        satisfies `predicate(value)`.
+        """
+        selected = copy.copy(self)
+        selected.entries = [entry for entry in self.entries if predicate(entry.value)]
+        return selected
+
+    def between(self, low, high):
+        """
+        Return a new StackCatalog containing only the conditions with values
+        between `low` and `high` (inclusive).
+        """
+        return self.select(lambda value: low <= value <= high)
+
+    def load(self, kind="mean", selection=np.s_[:], **kwargs):
+        """
+        Load the stacks of type `kind` (e.g. mean or saturated) for all
+        conditions in the catalog. Only return array elements included in
+        `selection` (default: all). Returns the values and the stacks, like
+        `load_npy`. Any additional **kwargs are passed to `stack_npy_files`.
+        """
+        entries = [entry for entry in self.entries if kind in entry.files]
+        stacked = stack_npy_files([entry.files[kind] for entry in entries], selection=selection, **kwargs)
+        values = np.array([entry.value for entry in entries])
+        return values, stacked
+
+
 def load_colour(stacks):
     """
     Load the Bayer colour pattern for a camera from its respective `stacks`
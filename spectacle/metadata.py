@@ -6,7 +6,7 @@ import numpy as np
 import json
 from collections import namedtuple
 
-from . import raw, analyse
+from . import raw, analyse, demosaicking
 
 def _convert_exposure_time(exposure):
     """
@@ -60,7 +60,9 @@ class Camera(object):
         self.settings = self.Settings(**settings)
 
         # Generate/calculate commonly used values/properties
-        self.bayer_map = self.generate_bayer_map()
+        # The full Bayer map is only generated when it is first used
+        self.bayer_tile = np.array(self.image.bayer_pattern, dtype=np.uint8)
+        self._bayer_map = None
         self.saturation = 2**self.image.bit_depth - 1
 
     def __repr__(self):
@@ -82,18 +84,29 @@ class Camera(object):
 
     def generate_bayer_map(self):
         """
-        Generate a Bayer map, with the Bayer channel (RGBG2) for each pixel.
+        Generate a Bayer map, with the Bayer channel (RGBG2) for each pixel,
+        by repeating the 2x2 Bayer tile over the image shape.
 
         To do:
             * Hide method (single underscore)
         """
-        bayer_map = np.zeros(self.image.shape, dtype=int)
-        bayer_map[0::2, 0::2] = self.image.bayer_pattern[0][0]
-        bayer_map[0::2, 1::2] = self.image.bayer_pattern[0][1]
-        bayer_map[1::2, 0::2] = self.image.bayer_pattern[1][0]
-        bayer_map[1::2, 1::2] = self.image.bayer_pattern[1][1]
+        height, width = self.image.shape
+        bayer_map = np.tile(self.bayer_tile, (-(-height//2), -(-width//2)))[:height, :width]
         return bayer_map
 
+    @property
+    def bayer_map(self):
+        """
+        Full-resolution Bayer map, with the Bayer channel (RGBG2) for each
+        pixel. This is generated when it is first used and then kept as a
+        read-only uint8 array. Functions that only need the Bayer pattern,
+        such as `raw.demosaick`, should use the 2x2 `bayer_tile` instead.
+        """
+        if self._bayer_map is None:
+            self._bayer_map = self.generate_bayer_map()
+            self._bayer_map.setflags(write=False)
+        return self._bayer_map
+
     def generate_ISO_range(self):
         """
         Generate an array with all ISO values possible for this camera.
@@ -109,26 +122,37 @@ class Camera(object):
         """
         write_json(self._as_dict(), path)
 
-    def demosaick(self, *data, **kwargs):
+    def demosaick(self, *data, views=False, **kwargs):
         """
-        Demosaick data using this camera's Bayer pattern.
+        Demosaick data using this camera's Bayer pattern. The channels are
+        split along the last two axes of each array; if `views` is True, they
+        are returned as views without copying (see `raw.demosaick`).
         """
-        RGBG_data = raw.demosaick(self.bayer_map, *data, **kwargs)
+        RGBG_data = raw.demosaick(self.bayer_tile, *data, views=views, **kwargs)
         return RGBG_data
 
+    def demosaick_full(self, data, **kwargs):
+        """
+        Demosaick data into a full-resolution RGB image using this camera's
+        Bayer pattern. Any additional **kwargs are passed to
+        `demosaicking.interpolate`.
+        """
+        RGB_data = demosaicking.interpolate(data, self.bayer_tile, **kwargs)
+        return RGB_data
+
     def plot_gauss_maps(self, data, **kwargs):
         """
         Plot Gaussian maps using analyse.plot_gauss_maps.
         Uses this camera's Bayer pattern.
         """
-        analyse.plot_gauss_maps(data, self.bayer_map, **kwargs)
+        analyse.plot_gauss_maps(data, self.bayer_tile, **kwargs)
 
     def plot_histogram_RGB(self, data, **kwargs):
         """
         Plot an RGB histogram maps using analyse.plot_gauss_maps.
         Uses this camera's Bayer pattern.
         """
-        analyse.plot_histogram_RGB(data, self.bayer_map, **kwargs)
+        analyse.plot_histogram_RGB(data, self.bayer_tile, **kwargs)
 
     @classmethod
     def read_from_file(cls, path):
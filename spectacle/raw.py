@@ -9,19 +9,47 @@ y = np.arange(ymin, ymax)
 x_small = np.arange(xmin/2, xmax/2)
 y_small = np.arange(ymin/2, ymax/2)
 
+# Offsets of the Bayer channels, cached per 2x2 Bayer tile
+_offset_cache = {}
+
+
 def _find_offset(color_pattern, colour):
     pos = np.array(np.where(color_pattern == colour)).T[0]
     return pos
 
 
-def demosaick(bayer_map, *data, **kwargs):
+def bayer_offsets(color_pattern):
+    """
+    Find the (row, column) offset of each Bayer channel (RGBG2) within a 2x2
+    tile of the Bayer pattern `color_pattern`. Only the first 2x2 tile is
+    used, so `color_pattern` may be a full Bayer map or just the tile. The
+    offsets are cached per tile, so repeated calls are cheap.
+    """
+    tile = np.asarray(color_pattern[:2, :2])
+    key = tuple(tile.ravel().tolist())
+    if key not in _offset_cache:
+        _offset_cache[key] = np.array([_find_offset(tile, i) for i in range(4)])
+    return _offset_cache[key].copy()
+
+
+def demosaick(bayer_map, *data, views=False, **kwargs):
     """
     Simplified demosaicking method for RGBG data.
     Uses a Bayer map `bayer_map` (RGBG channel for each pixel) and any number
     of input arrays `data`. Any additional **kwargs are passed to pull_apart.
+
+    The channels are split along the last two axes of each array, which are
+    the image axes (H, W). Any other axes must come first, e.g. a stack of
+    images of shape (N, H, W) is demosaicked into an array of shape
+    (N, 4, H/2, W/2). Arrays with the stack axis last, (H, W, N), must be
+    moved into this order first, e.g. with `np.moveaxis(data, -1, 0)`.
+
+    If `views` is True, each array is demosaicked into a tuple of four
+    strided views of it instead of a new array, so no data are copied (see
+    `pull_apart`).
     """
     # Demosaick the data
-    data_RGBG = [pull_apart(data_array, bayer_map, **kwargs)[0] for data_array in data]
+    data_RGBG = [pull_apart(data_array, bayer_map, views=views, **kwargs)[0] for data_array in data]
 
     # If only a single array was given, don't return a list
     if len(data_RGBG) == 1:
@@ -30,16 +58,82 @@ def demosaick(bayer_map, *data, **kwargs):
     return data_RGBG
 
 
-def pull_apart(raw_img, color_pattern, color_desc=b"RGBG"):
+def pull_apart(raw_img, color_pattern, color_desc=b"RGBG", views=False):
+    """
+    Split `raw_img` into its Bayer channels (RGBG2), using the Bayer pattern
+    `color_pattern` (a full Bayer map or its 2x2 tile). The channels are
+    split along the last two axes, so `raw_img` may have any number of
+    leading dimensions, e.g. a stack of images of shape (N, H, W).
+
+    If `views` is True, the channels are returned as a tuple of four strided
+    views of `raw_img`, without copying any data. Otherwise, they are
+    returned as a single array of shape (..., 4, H/2, W/2).
+
+    Also returns the offset of each channel within the 2x2 Bayer tile.
+    """
     if color_desc != b"RGBG":
-        raise ValueError(f"Image is of type {raw_img.color_desc} instead of RGBG")
-    offsets = np.array([_find_offset(color_pattern, i) for i in range(4)])
-    offX, offY = offsets.T
-    R, G, B, G2 = [raw_img[x::2, y::2] for x, y in zip(offX, offY)]
-    RGBG = np.stack((R, G, B, G2))
+        raise ValueError(f"Image is of type {color_desc} instead of RGBG")
+    offsets = bayer_offsets(color_pattern)
+    RGBG = tuple(raw_img[..., x::2, y::2] for x, y in offsets)
+    if not views:
+        RGBG = np.stack(RGBG, axis=-3)
     return RGBG, offsets
 
 
+def put_together(RGBG, color_pattern, out=None):
+    """
+    Re-mosaick Bayer channels into a single image; the inverse of
+    `pull_apart`. `RGBG` is either an array of shape (..., 4, H/2, W/2) or a
+    sequence of four arrays of shape (..., H/2, W/2), with any number of
+    leading dimensions. `color_pattern` is a full Bayer map or its 2x2 tile.
+
+    The channels are written through strided slices into `out`, which must
+    have shape (..., H, W). If `out` is None, a new array is made with the
+    same data type as `RGBG`. Returns the re-mosaicked array.
+    """
+    offsets = bayer_offsets(color_pattern)
+
+    # Iterate over the channels, not over the leading dimensions
+    if isinstance(RGBG, np.ndarray):
+        RGBG = np.moveaxis(RGBG, -3, 0)
+
+    if out is None:
+        *leading, height, width = RGBG[0].shape
+        out = np.empty((*leading, 2*height, 2*width), dtype=np.result_type(*RGBG))
+
+    for channel, (x, y) in zip(RGBG, offsets):
+        out[..., x::2, y::2] = channel
+    return out
+
+
+def bin_bayer(data, color_pattern, factor):
+    """
+    Bin `data` into `factor` x `factor` superpixels within each Bayer channel
+    (RGBG2), averaging pixels of the same channel only. The result is again a
+    mosaic with the Bayer pattern `color_pattern` (a full Bayer map or its
+    2x2 tile), but `factor` times smaller along each axis, so it can be used
+    like full-resolution data. `data` may have any number of leading
+    dimensions. Pixels at the edges that do not fill a whole superpixel are
+    discarded.
+    """
+    if factor == 1:
+        return data
+
+    RGBG, offsets = pull_apart(data, color_pattern, views=True)
+
+    # Crop every channel to a whole number of superpixels
+    height = min(channel.shape[-2] for channel in RGBG) // factor * factor
+    width = min(channel.shape[-1] for channel in RGBG) // factor * factor
+
+    binned = []
+    for channel in RGBG:
+        *leading, _, _ = channel.shape
+        blocks = channel[..., :height, :width].reshape(*leading, height//factor, factor, width//factor, factor)
+        binned.append(blocks.mean(axis=(-3, -1)))
+
+    return put_together(binned, color_pattern)
+
+
 def put_together_from_offsets(R, G, B, G2, offsets):
     result = np.zeros((R.shape[0]*2, R.shape[1]*2))
     for colour, offset in zip([R,G,B,G2], offsets):
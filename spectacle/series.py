@@ -0,0 +1,212 @@
+"""
+Code relating to stack series, a container format that stores the stacks of
+all conditions in a series (e.g. all exposure times) as one dataset.
+
+A stack series is a folder containing a JSON manifest and one memory-mappable
+.npy file per kind of stack (e.g. mean, stds, saturated). Each data file is
+chunked spatially: it has the shape (tiles_y, tiles_x, N, tile_y, tile_x), so
+one spatial tile of all N conditions is a single contiguous block on disk.
+Stacks with trailing dimensions, such as (H, W, 3) JPEG stacks, keep these at
+the end: (tiles_y, tiles_x, N, tile_y, tile_x, 3).
+Per-pixel analyses across conditions (gain, dark current, linearity) can then
+read one tile at a time without opening dozens of files.
+"""
+
+import numpy as np
+from . import io
+
+# Default spatial tile size, in pixels
+default_tile_shape = (256, 256)
+
+# Name of the manifest file in a stack series folder
+manifest_filename = "manifest.json"
+
+
+def _tile_grid(shape, tile_shape):
+    """
+    Number of tiles along each axis needed to cover an image of `shape` with
+    tiles of `tile_shape`.
+    """
+    return tuple(-(-size // tile) for size, tile in zip(shape, tile_shape))
+
+
+def write_series(target, values, stacks, tile_shape=default_tile_shape):
+    """
+    Write a stack series to the folder `target`. `values` are the values of
+    the N conditions (e.g. exposure times) and `stacks` is a dictionary with
+    the kind of stack (e.g. "mean") as keys and sequences of N arrays (e.g.
+    an array of shape (N, H, W)) as values. Any dimensions after the first two
+    (e.g. the colour axis of JPEG stacks) are kept as they are.
+
+    The stacks are written one condition at a time, so `stacks` may contain
+    generators or memory-mapped arrays that do not fit in memory.
+    """
+    target.mkdir(parents=True, exist_ok=True)
+    values = np.asarray(values)
+    N = len(values)
+    ty, tx = tile_shape
+
+    manifest = {"values": values.tolist(), "tile_shape": list(tile_shape), "kinds": {}}
+
+    for kind, arrays in stacks.items():
+        data = None
+        n = -1
+        for n, array in enumerate(arrays):
+            # Create the chunked data file based on the first array
+            if data is None:
+                shape = array.shape
+                Ty, Tx = _tile_grid(shape, tile_shape)
+                rest = shape[2:]
+                data = np.lib.format.open_memmap(target/f"{kind}.npy", mode="w+", dtype=array.dtype, shape=(Ty, Tx, N, ty, tx, *rest))
+
+            # Pad the array to a whole number of tiles and cut it into tiles
+            padded = np.zeros((Ty*ty, Tx*tx, *rest), dtype=array.dtype)
+            padded[:shape[0], :shape[1]] = array
+            data[:, :, n] = padded.reshape(Ty, ty, Tx, tx, *rest).swapaxes(1, 2)
+
+        if data is None:
+            raise ValueError(f"No '{kind}' stacks were given.")
+        assert n == N-1, f"Number of '{kind}' stacks ({n+1}) does not match number of values ({N})."
+        data.flush()
+        del data
+
+        manifest["kinds"][kind] = {"shape": list(shape), "dtype": np.dtype(array.dtype).str}
+
+    io.write_json(manifest, target/manifest_filename)
+
+
+def convert_folder(folder, target, retrieve_value=io.absolute_filename, tile_shape=default_tile_shape, kinds=None, **kwargs):
+    """
+    Convert the loose NPY stacks in `folder` into a stack series in `target`.
+    The value of each condition is parsed from its filename using
+    `retrieve_value`, to which any additional **kwargs are passed (see
+    `io.StackCatalog`).
+
+    The series contains the given `kinds` of stack (e.g. ["mean", "stds"]);
+    by default, all kinds of stack present in the folder. Only conditions
+    that have all of these kinds are included. A ValueError is raised if no
+    condition has all of them.
+    """
+    catalog = io.StackCatalog(folder, retrieve_value=retrieve_value, use_index=False, **kwargs)
+
+    # Use all kinds of stack present in the folder by default
+    if kinds is None:
+        kinds = [kind for kind in catalog.kinds if any(kind in entry.files for entry in catalog)]
+
+    # Only include the conditions that have every kind of stack
+    entries = [entry for entry in catalog if all(kind in entry.files for kind in kinds)]
+    if len(entries) == 0:
+        raise ValueError(f"No conditions in `{folder}` have all of the stacks {kinds}.")
+
+    # Values must be JSON-compatible, so file paths are stored as strings
+    values = [str(entry.value) if isinstance(entry.value, io.Path) else entry.value for entry in entries]
+
+    # Load each condition lazily, one at a time
+    def _load_lazily(kind):
+        for entry in entries:
+            yield io.load_array(entry.files[kind])
+    stacks = {kind: _load_lazily(kind) for kind in kinds}
+
+    write_series(target, values, stacks, tile_shape=tile_shape)
+
+
+class StackSeries(object):
+    """
+    Class that represents a stack series on disk. Data are memory-mapped, so
+    only the tiles or regions that are accessed are read from disk.
+    """
+    def __init__(self, path):
+        """
+        Open the stack series in the folder `path`.
+        """
+        self.path = path
+        manifest = io.load_json(path/manifest_filename)
+        self.values = np.array(manifest["values"])
+        self.tile_shape = tuple(manifest["tile_shape"])
+        self.shapes = {kind: tuple(info["shape"]) for kind, info in manifest["kinds"].items()}
+        self._data = {}
+
+    def __repr__(self):
+        """
+        Output for `print(StackSeries)`
+        """
+        return f"StackSeries('{self.path}', {len(self)} conditions, kinds={self.kinds})"
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def kinds(self):
+        """
+        Kinds of stack (e.g. mean, stds) contained in this series.
+        """
+        return list(self.shapes)
+
+    def _tiled(self, kind):
+        """
+        Memory-mapped tiled data of the given `kind`, with shape
+        (tiles_y, tiles_x, N, tile_y, tile_x, ...).
+        """
+        if kind not in self._data:
+            self._data[kind] = np.load(self.path/f"{kind}.npy", mmap_mode="r")
+        return self._data[kind]
+
+    def tile_grid(self, kind="mean"):
+        """
+        Number of tiles along each axis for the given `kind`.
+        """
+        return self._tiled(kind).shape[:2]
+
+    def load_tile(self, kind, i, j):
+        """
+        Load tile (`i`, `j`) of all conditions for the given `kind`, as an
+        array of shape (N, tile_y, tile_x, ...) (smaller for tiles at the edges).
+        The result is a read-only view of the memory-mapped data.
+        """
+        ty, tx = self.tile_shape
+        height, width = self.shapes[kind][:2]
+        tile = self._tiled(kind)[i, j]
+        return tile[:, :min(ty, height - i*ty), :min(tx, width - j*tx)]
+
+    def iter_tiles(self, kind="mean"):
+        """
+        Iterate over the tiles of all conditions for the given `kind`.
+        Yields tuples (`selection`, `tile`), with `selection` the slices of
+        the full image covered by the tile and `tile` as in `load_tile`.
+        """
+        ty, tx = self.tile_shape
+        Ty, Tx = self.tile_grid(kind)
+        for i in range(Ty):
+            for j in range(Tx):
+                tile = self.load_tile(kind, i, j)
+                yield np.s_[i*ty:i*ty+tile.shape[1], j*tx:j*tx+tile.shape[2]], tile
+
+    def load_region(self, kind, selection):
+        """
+        Load a region `selection` (a tuple of two slices, e.g. `np.s_[a:b, c:d]`)
+        of all conditions for the given `kind`, as an array of shape (N, h, w, ...).
+        Only the tiles that overlap the region are read.
+        """
+        ty, tx = self.tile_shape
+        height, width = self.shapes[kind][:2]
+        (y0, y1, ystep), (x0, x1, xstep) = [s.indices(size) for s, size in zip(selection, (height, width))]
+        assert ystep == 1 and xstep == 1, "Only contiguous regions can be loaded."
+
+        tiled = self._tiled(kind)
+        result = np.empty((len(self), max(y1-y0, 0), max(x1-x0, 0), *self.shapes[kind][2:]), dtype=tiled.dtype)
+        for i in range(y0//ty, -(-y1//ty)):
+            for j in range(x0//tx, -(-x1//tx)):
+                # Overlap between this tile and the region, in image coordinates
+                ya, yb = max(y0, i*ty), min(y1, (i+1)*ty)
+                xa, xb = max(x0, j*tx), min(x1, (j+1)*tx)
+                result[:, ya-y0:yb-y0, xa-x0:xb-x0] = tiled[i, j, :, ya-i*ty:yb-i*ty, xa-j*tx:xb-j*tx]
+
+        return result
+
+    def load(self, kind="mean"):
+        """
+        Load the full data of all conditions for the given `kind`. Returns
+        the values and an array of shape (N, H, W), like `io.load_npy`.
+        """
+        height, width = self.shapes[kind][:2]
+        return self.values, self.load_region(kind, np.s_[0:height, 0:width])
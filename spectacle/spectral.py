@@ -38,10 +38,12 @@ def load_monochromator_data(root, folder, blocksize=100):
     take the mean and std of the central `blocksize`x`blocksize` pixels.
     Return the wavelengths with assorted mean values and standard deviations.
     """
-    # Find the filenames
-    mean_files = sorted(folder.glob("*_mean.npy"))
-    stds_files = sorted(folder.glob("*_stds.npy"))
+    # Find the filenames, including compressed stacks
+    mean_files = io.find_arrays(folder, "*_mean.npy")
+    stds_files = io.find_arrays(folder, "*_stds.npy")
     assert len(mean_files) == len(stds_files)
+    if len(mean_files) == 0:
+        raise FileNotFoundError(f"No mean stacks found in `{folder}`")
 
     # Load metadata
     camera = io.load_metadata(root)
@@ -55,11 +57,9 @@ def load_monochromator_data(root, folder, blocksize=100):
     means = np.zeros((len(mean_files), 4))
     stds  = means.copy()
 
-    # Loop over all files
-    for j, (mean_file, stds_file) in enumerate(zip(mean_files, stds_files)):
-        # Load the mean data
-        m = np.load(mean_file)
-
+    # Loop over all files, loading the next files while processing the
+    # current one
+    for j, (mean_file, m) in enumerate(io.prefetch(mean_files, io.load_array, mmap_mode=None)):
         # Bias correction; don't use calibrate.correct_bias to prevent loading
         # the data from file every time
         m = m - bias
@@ -0,0 +1,873 @@
+"""
+Code relating to stacking images, such as calculating the mean and standard
+deviation per pixel over a series of identical exposures.
+
+The statistics are calculated in a single pass over the data, so the memory
+required for stacking is independent of the number of images. Robust methods
+(median, sigma clipping, trimmed mean) that need every frame per pixel are
+also available; these process the image in bands of rows, so their memory use
+is bounded as well.
+"""
+
+import numpy as np
+import os
+import json
+from tempfile import TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
+from astropy.stats import sigma_clipped_stats
+from . import io
+
+# Version of the stacking algorithm, recorded in the stack manifests. Increase
+# this when the stacking outputs change, so existing stacks are rebuilt.
+algorithm_version = 3
+
+
+def _save_npz(filename, **arrays):
+    """
+    Save `arrays` to the NPZ file `filename`. The arrays are written to a
+    temporary file first, which then replaces `filename`, so an interrupted
+    save never leaves a partially written file.
+    """
+    temporary = io.Path(f"{filename}.tmp")
+    with open(temporary, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(temporary, filename)
+
+
+class RunningStatistics(object):
+    """
+    Class that accumulates the per-pixel mean and variance of a series of
+    images in a single pass, using Welford's algorithm. Only the number of
+    images, the running mean, and the running sum of squared deviations (M2)
+    are kept in memory.
+    """
+    def __init__(self):
+        """
+        Generate an empty RunningStatistics object. The shape of the images is
+        set by the first image that is added.
+        """
+        self.count = 0
+        self.mean = None
+        self.M2 = None
+
+    def __repr__(self):
+        """
+        Output for `print(RunningStatistics)` (or a subclass)
+        """
+        shape = None if self.mean is None else self.mean.shape
+        return f"{type(self).__name__}(count={self.count}, shape={shape})"
+
+    def add(self, image):
+        """
+        Add a single image `image` to the statistics.
+        """
+        # Create the accumulators from the first image
+        if self.mean is None:
+            self.mean = np.zeros(image.shape, dtype=np.float64)
+            self.M2 = np.zeros(image.shape, dtype=np.float64)
+
+        self.count += 1
+
+        # Welford update, done in-place to avoid full-size temporaries
+        # delta = x - mean ; mean += delta / n ; M2 += delta * (x - mean)
+        delta = np.subtract(image, self.mean, dtype=np.float64)
+        self.mean += delta / self.count
+        delta *= np.subtract(image, self.mean, dtype=np.float64)
+        self.M2 += delta
+
+    def add_multiple(self, images):
+        """
+        Add every image in an iterable `images` (e.g. an array of shape
+        (N, H, W)) to the statistics.
+        """
+        for image in images:
+            self.add(image)
+
+    @property
+    def variance(self):
+        """
+        Per-pixel (population) variance of the images added so far.
+        """
+        return self.M2 / self.count
+
+    @property
+    def std(self):
+        """
+        Per-pixel (population) standard deviation of the images added so far.
+        """
+        return np.sqrt(self.variance)
+
+    def result(self, dtype=np.float32):
+        """
+        Return the per-pixel mean and standard deviation of the images added
+        so far, as arrays of type `dtype`.
+        """
+        if self.count == 0:
+            raise ValueError("Cannot calculate statistics without any images.")
+        return self.mean.astype(dtype), self.std.astype(dtype)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another RunningStatistics object `other`
+        (e.g. a partial stack made on another machine) into this one, using
+        the parallel form of Welford's algorithm (Chan et al.). The result is
+        the same as if all images had been added to one object.
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.M2 = other.count, np.array(other.mean, dtype=np.float64), np.array(other.M2, dtype=np.float64)
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * (other.count / count)
+        delta *= delta
+        delta *= self.count * other.count / count
+        self.M2 += other.M2
+        self.M2 += delta
+        self.count = count
+
+    def save(self, filename, **extra):
+        """
+        Save the sufficient statistics (number of images, mean, M2) to
+        `filename` (an NPZ file), so more images can be added later with
+        `load_statistics`. Any `extra` arrays are saved in the same file.
+        """
+        _save_npz(filename, kind=type(self).__name__, count=self.count, mean=self.mean, M2=self.M2, **extra)
+
+
+class IntegerStatistics(RunningStatistics):
+    """
+    Class that accumulates the per-pixel mean and variance of a series of
+    integer images (e.g. uint16 RAW data) in a single pass, using exact
+    integer sums: the sum of the images in uint32 and the sum of their squares
+    in uint64. The mean and variance are then calculated from these sums
+    without any rounding errors building up while stacking.
+
+    Only images with up to 16 bits per pixel are supported. The variance is
+    exact for up to `max_exact_count` images; beyond that, the sums are still
+    exact but the variance is calculated in floating point.
+    """
+    # Largest number of images for which count * sum_squares fits in uint64
+    max_exact_count = 2**16
+
+    def __init__(self):
+        """
+        Generate an empty IntegerStatistics object. The shape of the images
+        is set by the first image that is added.
+        """
+        self.count = 0
+        self.sum = None
+        self.sum_squares = None
+
+    @staticmethod
+    def supports(image):
+        """
+        Check whether `image` can be stacked with integer sums, i.e. whether
+        it is an unsigned integer array with at most 16 bits per pixel.
+        """
+        return image.dtype.kind in "ub" and image.dtype.itemsize <= 2
+
+    def add(self, image):
+        """
+        Add a single image `image` to the statistics.
+        """
+        if not self.supports(image):
+            raise ValueError(f"Cannot stack images of type {image.dtype} with integer sums; expected unsigned integers of at most 16 bits.")
+
+        # Create the accumulators from the first image
+        if self.sum is None:
+            self.sum = np.zeros(image.shape, dtype=np.uint32)
+            self.sum_squares = np.zeros(image.shape, dtype=np.uint64)
+
+        # A uint32 sum of uint16 values can overflow beyond 65537 images
+        if self.count == self.max_exact_count + 1:
+            self.sum = self.sum.astype(np.uint64)
+
+        self.count += 1
+
+        # The square of a uint16 value always fits in uint32
+        self.sum += image
+        self.sum_squares += np.multiply(image, image, dtype=np.uint32)
+
+    @property
+    def mean(self):
+        """
+        Per-pixel mean of the images added so far.
+        """
+        if self.sum is None:
+            return None
+        return self.sum / self.count
+
+    @property
+    def variance(self):
+        """
+        Per-pixel (population) variance of the images added so far.
+        """
+        if self.count <= self.max_exact_count:
+            # N * sum(x^2) - (sum x)^2, calculated exactly in uint64
+            total = self.sum.astype(np.uint64)
+            numerator = self.count * self.sum_squares - total * total
+            return numerator / self.count**2
+        else:
+            mean = self.mean
+            return np.maximum(self.sum_squares / self.count - mean * mean, 0)
+
+    @property
+    def M2(self):
+        """
+        Per-pixel sum of squared deviations from the mean, as in
+        `RunningStatistics`.
+        """
+        if self.sum is None:
+            return None
+        return self.variance * self.count
+
+    def merge(self, other):
+        """
+        Merge the statistics of another IntegerStatistics object `other`
+        (e.g. a partial stack made on another machine) into this one. Since
+        the sums are exact, so is the result.
+        """
+        if not isinstance(other, IntegerStatistics):
+            raise TypeError(f"Cannot merge {type(other).__name__} into IntegerStatistics exactly; merge into a RunningStatistics object instead.")
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.sum, self.sum_squares = other.count, other.sum.copy(), other.sum_squares.copy()
+            return
+
+        # A uint32 sum of uint16 values can overflow beyond 65537 images
+        if self.count + other.count > self.max_exact_count + 1:
+            self.sum = self.sum.astype(np.uint64)
+
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+
+    def save(self, filename, **extra):
+        """
+        Save the sufficient statistics (number of images, sum, sum of
+        squares) to `filename` (an NPZ file), so more images can be added
+        later with `load_statistics`. Any `extra` arrays are saved in the
+        same file.
+        """
+        _save_npz(filename, kind=type(self).__name__, count=self.count, sum=self.sum, sum_squares=self.sum_squares, **extra)
+
+
+def load_statistics(filename):
+    """
+    Load statistics saved with `RunningStatistics.save` or
+    `IntegerStatistics.save` from `filename`, returning an object of the
+    same class, to which more images can be added.
+    """
+    with np.load(filename) as data:
+        kind = str(data["kind"])
+        if kind == "IntegerStatistics":
+            statistics = IntegerStatistics()
+            statistics.sum, statistics.sum_squares = data["sum"], data["sum_squares"]
+        elif kind == "RunningStatistics":
+            statistics = RunningStatistics()
+            statistics.mean, statistics.M2 = data["mean"], data["M2"]
+        else:
+            raise ValueError(f"Unknown type of statistics `{kind}` in {filename}")
+        statistics.count = int(data["count"])
+    return statistics
+
+
+def merge_statistics(statistics):
+    """
+    Merge an iterable of statistics objects (e.g. partial stacks of the same
+    condition) into one. Integer statistics are merged exactly; if any of
+    the inputs are floating-point statistics, the result is as well.
+    """
+    statistics = list(statistics)
+    if all(isinstance(s, IntegerStatistics) for s in statistics):
+        merged = IntegerStatistics()
+    else:
+        merged = RunningStatistics()
+    for s in statistics:
+        merged.merge(s)
+    return merged
+
+
+class FlagCounts(object):
+    """
+    Class that counts, per pixel, in how many images of a series the pixel
+    was saturated and in how many it was an outlier. The counts are kept in
+    compact unsigned integer arrays: uint8, widened to uint16 (and beyond)
+    once there are too many images.
+
+    The counts are saved with the stacks, so pixels that saturated in only
+    some frames can be masked later without loading the frames again. A
+    pixel value is counted as an outlier if it deviates from the final value
+    of its stack by more than `sigma` times the final spread, so the images
+    are counted in a second pass once the stack is complete (see
+    `count_flags` and `count_flags_files`).
+    """
+    def __init__(self, saturation=None, sigma=5.):
+        """
+        Generate an empty FlagCounts object. Pixels are counted as saturated
+        if their value is at least `saturation`; if `saturation` is None,
+        saturated pixels are not counted.
+        """
+        self.saturation = saturation
+        self.sigma = sigma
+        self.count = 0
+        self.saturated = None
+        self.outliers = None
+
+    def __repr__(self):
+        """
+        Output for `print(FlagCounts)`
+        """
+        shape = None if self.saturated is None else self.saturated.shape
+        return f"FlagCounts(count={self.count}, shape={shape})"
+
+    def _widen(self, count):
+        """
+        Widen the count arrays if they cannot hold `count`.
+        """
+        while count > np.iinfo(self.saturated.dtype).max:
+            dtype = np.uint16 if self.saturated.dtype == np.uint8 else np.uint32
+            self.saturated = self.saturated.astype(dtype)
+            self.outliers = self.outliers.astype(dtype)
+
+    def add(self, image, values, spreads):
+        """
+        Count the saturated and outlying pixels in a single image `image`,
+        given the final `values` and `spreads` (e.g. mean and standard
+        deviation) of the stack it belongs to.
+        """
+        # Create the counts from the first image
+        if self.saturated is None:
+            self.saturated = np.zeros(image.shape, dtype=np.uint8)
+            self.outliers = np.zeros(image.shape, dtype=np.uint8)
+
+        self.count += 1
+        self._widen(self.count)
+
+        if self.saturation is not None:
+            self.saturated += (image >= self.saturation)
+
+        deviation = np.subtract(image, values, dtype=np.float32)
+        np.abs(deviation, out=deviation)
+        self.outliers += (deviation > self.sigma * spreads)
+
+    def merge(self, other):
+        """
+        Add the counts of another FlagCounts object `other` (e.g. from a
+        partial stack made on another machine) to this one.
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.saturated, self.outliers = other.count, other.saturated.copy(), other.outliers.copy()
+            return
+
+        self.count += other.count
+        self._widen(self.count)
+        self.saturated += other.saturated
+        self.outliers += other.outliers
+
+
+def count_flags(frames, values, spreads, saturation=None, sigma=5., tile_rows=16):
+    """
+    Count, per pixel, in how many of `frames` (an array-like of shape
+    (N, H, ...)) the pixel was saturated (at least `saturation`) and in how
+    many it deviated from `values` by more than `sigma` times `spreads`,
+    e.g. the results of `stack_robust`. The frames are read in bands of
+    `tile_rows` rows. Returns a FlagCounts object.
+    """
+    N = len(frames)
+    flags = FlagCounts(saturation, sigma)
+    flags.saturated = np.zeros(values.shape, dtype=np.uint8)
+    flags.outliers = np.zeros(values.shape, dtype=np.uint8)
+    flags._widen(N)
+    flags.count = N
+
+    for start in range(0, values.shape[0], tile_rows):
+        band = np.asarray(frames[:, start:start+tile_rows])
+        rows = np.s_[start:start+tile_rows]
+        if saturation is not None:
+            flags.saturated[rows] = (band >= saturation).sum(axis=0)
+        deviation = np.abs(band - values[rows])
+        flags.outliers[rows] = (deviation > sigma * spreads[rows]).sum(axis=0)
+
+    return flags
+
+
+def count_flags_files(files, loader, values, spreads, saturation=None, sigma=5.):
+    """
+    Count, per pixel, in how many of the images in `files` the pixel was
+    saturated (at least `saturation`) and in how many it deviated from
+    `values` by more than `sigma` times `spreads`, e.g. the mean and standard
+    deviation of their stack. The images are loaded one at a time with
+    `loader`, reading ahead on a background thread. Returns a FlagCounts
+    object.
+    """
+    flags = FlagCounts(saturation, sigma)
+    for file, image in io.prefetch(files, loader):
+        flags.add(image, values, spreads)
+    return flags
+
+
+def stack_images(images, dtype=np.float32):
+    """
+    Calculate the per-pixel mean and standard deviation of the arrays in an
+    iterable `images` in a single pass. `images` may be a generator, so the
+    images do not need to be in memory at the same time. Integer images of up
+    to 16 bits are stacked with exact integer sums (see `IntegerStatistics`).
+    """
+    images = iter(images)
+    first = next(images)
+
+    # Use exact integer sums for integer data, Welford's algorithm otherwise
+    if IntegerStatistics.supports(first):
+        statistics = IntegerStatistics()
+    else:
+        statistics = RunningStatistics()
+
+    statistics.add(first)
+    statistics.add_multiple(images)
+    mean, stds = statistics.result(dtype=dtype)
+    return mean, stds
+
+
+def add_files(statistics, files, loader):
+    """
+    Add the images in `files` to `statistics`, loading them one at a time
+    with `loader` (e.g. `io.load_raw_image`) and reading ahead on a
+    background thread. If `statistics` is None, a new statistics object is
+    made based on the type of the first image (see `stack_images`).
+
+    Returns the updated statistics object.
+    """
+    for file, image in io.prefetch(files, loader):
+        if statistics is None:
+            statistics = IntegerStatistics() if IntegerStatistics.supports(image) else RunningStatistics()
+        statistics.add(image)
+    return statistics
+
+
+def _median(data, axis=0):
+    """
+    Median and normalised median absolute deviation (a robust estimate of
+    the standard deviation) of `data` along `axis`.
+    """
+    median = np.median(data, axis=axis)
+    deviation = 1.4826 * np.median(np.abs(data - np.expand_dims(median, axis)), axis=axis)
+    return median, deviation
+
+
+def _sigma_clipped(data, axis=0, sigma=3., maxiters=5):
+    """
+    Mean and standard deviation of `data` along `axis`, after iteratively
+    removing values more than `sigma` standard deviations from the median.
+    """
+    mean, median, std = sigma_clipped_stats(data, axis=axis, sigma=sigma, maxiters=maxiters)
+    return mean, std
+
+
+def _trimmed(data, axis=0, proportion=0.1):
+    """
+    Mean and standard deviation of `data` along `axis`, after removing the
+    lowest and highest `proportion` of values.
+    """
+    N = data.shape[axis]
+    cut = int(proportion * N)
+    trimmed = np.sort(data, axis=axis).take(np.arange(cut, N-cut), axis=axis)
+    return trimmed.mean(axis=axis), trimmed.std(axis=axis)
+
+
+# Robust stacking methods, mapping names to functions that return the stacked
+# value and spread along an axis
+robust_methods = {"median": _median, "sigma_clip": _sigma_clipped, "trimmed": _trimmed}
+
+
+def stack_robust(frames, method="sigma_clip", tile_rows=16, workers=None, dtype=np.float32, **kwargs):
+    """
+    Stack `frames`, an array-like of shape (N, H, ...) such as a memory-mapped
+    array or an `io.FrameArchive`, using a robust method that is insensitive
+    to outliers such as cosmic rays or light leaks in single frames:
+        * "median": the per-pixel median, with the normalised median absolute
+        deviation as the spread.
+        * "sigma_clip": the per-pixel mean and standard deviation after
+        iterative sigma clipping.
+        * "trimmed": the per-pixel mean and standard deviation after removing
+        the lowest and highest values.
+    Any additional **kwargs are passed to the method (e.g. `sigma` for
+    "sigma_clip" or `proportion` for "trimmed").
+
+    Because these methods need all frames for each pixel, the image is split
+    into bands of `tile_rows` rows, which are read and stacked separately by a
+    pool of `workers` threads (default: one per CPU core). Memory use is
+    bounded by roughly `workers` * N * `tile_rows` * W values.
+
+    Returns the stacked values and spreads as arrays of type `dtype`.
+    """
+    try:
+        function = robust_methods[method]
+    except KeyError:
+        raise ValueError(f"Invalid stacking method `{method}` given; must be one of `{list(robust_methods)}`")
+
+    # Use all available cores if no number of workers was given
+    if workers is None:
+        workers = os.cpu_count()
+
+    N, height, *rest = frames.shape
+    values = np.empty((height, *rest), dtype=dtype)
+    spreads = np.empty((height, *rest), dtype=dtype)
+
+    # Stack one band of rows, reading it from all frames
+    def _stack_band(start):
+        band = np.asarray(frames[:, start:start+tile_rows], dtype=np.float32)
+        values[start:start+tile_rows], spreads[start:start+tile_rows] = function(band, axis=0, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(_stack_band, start) for start in range(0, height, tile_rows)]
+        for job in jobs:
+            job.result()  # re-raise any errors from the threads
+
+    return values, spreads
+
+
+def _write_to_memmap(images, count, filename):
+    """
+    Write `count` arrays from an iterable `images` into a new memory-mapped
+    .npy file `filename`, one at a time. Return the memory-mapped array.
+    """
+    frames = None
+    for j, image in enumerate(images):
+        if frames is None:
+            frames = np.lib.format.open_memmap(filename, mode="w+", dtype=image.dtype, shape=(count, *image.shape))
+        frames[j] = image
+    frames.flush()
+    return frames
+
+
+def stack_folder_robust(folder, method="sigma_clip", raw_pattern="*.dng", jpg_pattern="*.jp*g", saturation=None, outlier_sigma=5., temporary_folder=None, **kwargs):
+    """
+    Stack the raw and JPEG files in `folder` using a robust method (see
+    `stack_robust`), to which any additional **kwargs are passed. Saturated
+    and outlying pixels in the raw files are counted with `count_flags`.
+
+    The files are decoded one at a time into a temporary memory-mapped array
+    in `temporary_folder` (default: the system temporary folder), so that
+    bands of rows can be read from all frames without keeping them in memory.
+    This array is as large as all raw frames together.
+
+    Returns the raw value and spread stacks, the raw FlagCounts, and the
+    JPEG value and spread stacks (None if there are no JPEG files).
+    """
+    with TemporaryDirectory(dir=temporary_folder) as temporary:
+        temporary = io.Path(temporary)
+
+        raw_files = sorted(folder.glob(raw_pattern))
+        images = (image for path, image, colors in io.iter_raw_frames(folder, raw_pattern))
+        frames = _write_to_memmap(images, len(raw_files), temporary/"raw.npy")
+        mean, stds = stack_robust(frames, method=method, **kwargs)
+        flags = count_flags(frames, mean, stds, saturation=saturation, sigma=outlier_sigma)
+        del frames
+
+        jpg_files = sorted(folder.glob(jpg_pattern))
+        if len(jpg_files) == 0:
+            return mean, stds, flags, None, None
+
+        images = (image for path, image in io.prefetch(jpg_files, io.load_jpg_image))
+        frames = _write_to_memmap(images, len(jpg_files), temporary/"jpg.npy")
+        jmean, jstds = stack_robust(frames, method=method, **kwargs)
+        del frames
+
+    return mean, stds, flags, jmean, jstds
+
+
+def input_manifest(folder, raw_pattern="*.dng", jpg_pattern="*.jp*g", method="mean"):
+    """
+    Generate a manifest of the inputs for stacking `folder`: the stacking
+    algorithm version, the stacking method, and the name, size, and
+    modification time of each raw and JPEG file.
+    """
+    files = sorted(set(folder.glob(raw_pattern)) | set(folder.glob(jpg_pattern)))
+    manifest = {"version": algorithm_version,
+                "method": method,
+                "files": file_information(files)}
+    return manifest
+
+
+def file_information(files):
+    """
+    Dictionary with the name of each of `files` as keys and its size and
+    modification time as values, used to detect changed inputs.
+    """
+    return {file.name: [file.stat().st_size, file.stat().st_mtime] for file in files}
+
+
+def manifest_path(goal):
+    """
+    Path of the manifest file saved with the stacks at `goal`.
+    """
+    return io.Path(f"{goal}_manifest.json")
+
+
+def is_up_to_date(folder, goal, raw_pattern="*.dng", jpg_pattern="*.jp*g", method="mean"):
+    """
+    Check whether the stacks of `folder` saved at `goal` are up to date, i.e.
+    whether all outputs exist and the manifest saved with them matches the
+    current inputs (see `input_manifest`).
+    """
+    try:
+        manifest_saved = io.load_json(manifest_path(goal))
+    except (OSError, ValueError):
+        return False
+
+    manifest_current = input_manifest(folder, raw_pattern, jpg_pattern, method)
+    if manifest_saved != manifest_current:
+        return False
+
+    # Check that the outputs themselves still exist
+    outputs = ["mean", "stds", "saturated", "outliers"]
+    if any(folder.glob(jpg_pattern)):
+        outputs += ["jmean", "jstds"]
+    try:
+        for kind in outputs:
+            io.resolve_array_path(f"{goal}_{kind}.npy")
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def statistics_path(goal, prefix=""):
+    """
+    Path of the file containing the sufficient statistics of the stacks at
+    `goal`, saved with `save_stacks`. Use `prefix` "j" for the statistics of
+    the JPEG stacks.
+    """
+    return io.Path(f"{goal}_{prefix}statistics.npz")
+
+
+def _load_inputs(filename):
+    """
+    Load the algorithm version and the information on the stacked files (see
+    `file_information`) from a statistics file saved with `save_stacks`.
+    """
+    with np.load(filename) as data:
+        return int(data["version"]), json.loads(str(data["inputs"]))
+
+
+def stacked_files(goal, files, prefix=""):
+    """
+    Find the names of the `files` that are included in the statistics saved
+    at `goal` for the given `prefix` (see `statistics_path`), and can be
+    kept when adding new files.
+
+    The statistics file itself records which files were stacked, so it is
+    always consistent with the statistics. If any file that was stacked
+    before has since changed or been removed, if the statistics were made
+    with a different algorithm version, or if there are no statistics, the
+    stacks cannot be appended to and an empty set is returned.
+    """
+    try:
+        version, inputs = _load_inputs(statistics_path(goal, prefix))
+    except (OSError, KeyError, ValueError):
+        return set()
+
+    if version != algorithm_version:
+        return set()
+
+    # Every file that was stacked before must still be there, unchanged
+    current = file_information(files)
+    if any(current.get(name) != info for name, info in inputs.items()):
+        return set()
+
+    return set(inputs)
+
+
+def _update_stacks(files, loader, goal, prefix, compression=io.default_compression, saturation=None, outlier_sigma=None, append=True):
+    """
+    Stack the images in `files` and save the results at `goal` with
+    `save_stacks`. If `append` is True and statistics saved earlier for
+    this `prefix` can be appended to (see `stacked_files`), only the new
+    files are loaded and added to them.
+
+    If `outlier_sigma` is given, saturated and outlying pixels are counted
+    against the final stacks (see `count_flags_files`) and saved as well.
+    This needs a second pass over all `files`, including any that were
+    stacked before.
+    """
+    # Record the inputs before loading them, so files changing while
+    # stacking are stacked again the next time
+    inputs = file_information(files)
+
+    stacked = stacked_files(goal, files, prefix) if append else set()
+    statistics = None
+    if stacked:
+        statistics = load_statistics(statistics_path(goal, prefix))
+
+    statistics = add_files(statistics, [file for file in files if file.name not in stacked], loader)
+
+    flags = None
+    if outlier_sigma is not None:
+        mean, stds = statistics.result()
+        flags = count_flags_files(files, loader, mean, stds, saturation=saturation, sigma=outlier_sigma)
+
+    save_stacks(statistics, goal, prefix, compression, inputs=inputs, flags=flags)
+
+
+def save_stacks(statistics, goal, prefix="", compression=io.default_compression, inputs={}, flags=None):
+    """
+    Save the mean and standard deviation from `statistics` to
+    `goal`_`prefix`mean.npy and `goal`_`prefix`stds.npy (see
+    `io.save_array`), and the counts in `flags` (a FlagCounts object), if
+    given, with `save_flags`.
+
+    The statistics themselves are saved last, to `statistics_path`, together
+    with the flag counts and the information on the stacked files `inputs`
+    (see `file_information`), so more files can be added later.
+    """
+    mean, stds = statistics.result()
+    io.save_array(f"{goal}_{prefix}mean.npy", mean, compression=compression)
+    io.save_array(f"{goal}_{prefix}stds.npy", stds, compression=compression)
+
+    extra = {"version": algorithm_version, "inputs": json.dumps(inputs)}
+    if flags is not None:
+        save_flags(flags, goal, compression)
+        extra.update(saturated=flags.saturated, outliers=flags.outliers)
+
+    statistics.save(statistics_path(goal, prefix), **extra)
+
+
+def save_flags(flags, goal, compression=io.default_compression):
+    """
+    Save the counts of saturated and outlying pixels from `flags` (a
+    FlagCounts object) to `goal`_saturated.npy and `goal`_outliers.npy (see
+    `io.save_array`).
+    """
+    io.save_array(f"{goal}_saturated.npy", flags.saturated, compression=compression)
+    io.save_array(f"{goal}_outliers.npy", flags.outliers, compression=compression)
+
+
+def load_flags(goal):
+    """
+    Load the counts of saturated and outlying pixels saved with the RAW
+    statistics at `goal` (see `save_stacks`) into a FlagCounts object.
+    """
+    flags = FlagCounts()
+    with np.load(statistics_path(goal)) as data:
+        flags.count = int(data["count"])
+        flags.saturated = data["saturated"]
+        flags.outliers = data["outliers"]
+    return flags
+
+
+def merge_stacks(goals, target, compression=io.default_compression):
+    """
+    Merge the mean stacks saved at each of `goals` (e.g. partial stacks of
+    one condition, made on different machines) into stacks at `target`,
+    using their saved statistics (see `merge_statistics`). JPEG stacks are
+    merged if all `goals` have them. The flag counts of the RAW data are
+    added together; their outliers remain counted against the stacks of
+    each goal, since the frames themselves are not loaded again.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for prefix in ("", "j"):
+        paths = [statistics_path(goal, prefix) for goal in goals]
+        if prefix and not all(path.exists() for path in paths):
+            continue
+        statistics = merge_statistics(load_statistics(path) for path in paths)
+
+        # Combine the information on the stacked files of all goals
+        inputs = {}
+        for path in paths:
+            inputs.update(_load_inputs(path)[1])
+
+        # Add the flag counts of the RAW data
+        flags = None
+        if not prefix:
+            flags = FlagCounts()
+            for goal in goals:
+                flags.merge(load_flags(goal))
+
+        save_stacks(statistics, target, prefix, compression, inputs=inputs, flags=flags)
+
+
+def stack_folder(folder, goal, raw_pattern="*.dng", jpg_pattern="*.jp*g", compression=io.default_compression, method="mean", append=True, saturation=None, outlier_sigma=5., **kwargs):
+    """
+    Stack the raw and JPEG files in `folder` and save the results to
+    `goal`_mean.npy, `goal`_stds.npy, `goal`_jmean.npy, and `goal`_jstds.npy.
+    JPEG stacks are only made if there are raw files as well. A manifest of
+    the inputs (see `input_manifest`) is saved to `goal`_manifest.json once
+    all stacks have been saved.
+
+    For the raw files, the number of frames in which each pixel was saturated
+    (at least `saturation`, default: the white level of the first raw file)
+    or an outlier (more than `outlier_sigma` standard deviations from the
+    mean) is saved to `goal`_saturated.npy and `goal`_outliers.npy. These are
+    counted against the final stacks, in a second pass over the raw files.
+
+    The stacks are saved with `io.save_array`, optionally compressed with the
+    given `compression` codec.
+
+    If `method` is "mean", the mean and standard deviation are calculated in
+    a single pass. The sufficient statistics are saved alongside the stacks
+    (see `statistics_path`), so if `append` is True and files were only
+    added to `folder` since it was last stacked, only the new files are
+    loaded and added to the existing stacks.
+
+    Otherwise, a robust method is used (see `stack_robust`), to which any
+    additional **kwargs are passed; the `_mean` and `_stds` files then
+    contain the robust value and spread.
+
+    Return True if any stacks were saved, False if `folder` does not contain
+    any raw files.
+    """
+    # If there are no RAW files in this folder, there is nothing to stack
+    if not any(folder.glob(raw_pattern)):
+        return False
+
+    # Record the inputs before stacking, so files changing during stacking
+    # cause the stacks to be rebuilt the next time
+    manifest = input_manifest(folder, raw_pattern, jpg_pattern, method)
+
+    # Create the goal folder if it does not exist yet
+    goal.parent.mkdir(parents=True, exist_ok=True)
+
+    # Use the white level of the RAW files as saturation level by default
+    raw_files = sorted(folder.glob(raw_pattern))
+    if saturation is None:
+        with io.RawFrame(raw_files[0]) as frame:
+            saturation = frame.white_level
+
+    # Robust stacking needs all frames per pixel, so RAW and JPEG data are
+    # stacked together from temporary memory-mapped files
+    if method != "mean":
+        mean, stds, flags, jmean, jstds = stack_folder_robust(folder, method, raw_pattern, jpg_pattern, saturation=saturation, outlier_sigma=outlier_sigma, **kwargs)
+
+        # Remove any statistics of earlier mean stacks, which no longer
+        # match the saved stacks and flag counts
+        for prefix in ("", "j"):
+            statistics_path(goal, prefix).unlink(missing_ok=True)
+
+        io.save_array(f"{goal}_mean.npy", mean, compression=compression)
+        io.save_array(f"{goal}_stds.npy", stds, compression=compression)
+        save_flags(flags, goal, compression)
+        if jmean is not None:
+            io.save_array(f"{goal}_jmean.npy", jmean, compression=compression)
+            io.save_array(f"{goal}_jstds.npy", jstds, compression=compression)
+
+    else:
+        # Stack and save the RAW data, then count saturated and outlying
+        # pixels in a second pass. Existing stacks are appended to where
+        # possible (see `stacked_files`)
+        _update_stacks(raw_files, io.load_raw_image, goal, "", compression, saturation=saturation, outlier_sigma=outlier_sigma, append=append)
+
+        # Stack and save the JPEG data, if there are any
+        jpg_files = sorted(folder.glob(jpg_pattern))
+        if len(jpg_files) > 0:
+            _update_stacks(jpg_files, io.load_jpg_image, goal, "j", compression, append=append)
+
+    # Save the manifest of the inputs
+    io.write_json(manifest, manifest_path(goal))
+
+    return True
@@ -11,9 +11,6 @@ angles, means = io.load_means(f"{folder}/stacks/linearity/", retrieve_value=io.s
 angles, stds  = io.load_stds (f"{folder}/stacks/linearity/", retrieve_value=io.split_pol_angle)
 colours = np.load(f"{folder}/stacks/colour.npy")
 
-mean_reshaped = np.moveaxis(means, 0, 2)
-stds_reshaped = np.moveaxis(stds , 0, 2)
-
 def malus_amp(angles, amplitude, offset_angle, offset_intensity):
     I = offset_intensity + amplitude * malus(angles, offset_angle)
     return I
@@ -29,7 +26,8 @@ X, Y = np.meshgrid(x, y)
 (x0, y0) = (len(x) / 2, len(y) / 2)
 D = np.sqrt((X - x0)**2 + (Y - y0)**2)
 
-meanRGBG, stdsRGBG, D_split = raw.demosaick(colours, mean_reshaped, stds_reshaped, D)
+# The stacks have shape (N, H, W); demosaicking gives (N, 4, H/2, W/2)
+meanRGBG, stdsRGBG, D_split = raw.demosaick(colours, means, stds, D)
 
 outer_radii = np.arange(1000, 2000, 75)
 
@@ -45,7 +43,7 @@ allstds = allmean.copy()
 for j in range(4):
     for i, radius in enumerate(outer_radii):
         for k, angle in enumerate(angles):
-            allmean[j,i,k], allstds[j,i,k] = ring_mean(radius, meanRGBG[j,...,k], D_split[j])
+            allmean[j,i,k], allstds[j,i,k] = ring_mean(radius, meanRGBG[k,j], D_split[j])
     print(j)
 
 ringmeans = np.zeros(len(outer_radii))
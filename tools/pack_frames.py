@@ -0,0 +1,52 @@
+"""
+Walk through a folder and pack the RAW images found into frame archives. This
+script will walk through all the subfolders of a given folder and generate a
+frame archive for each folder containing RAW images, in the same place as the
+stacks generated by `stack_mean_std.py`. For example, the images in
+`level1/level2/level3/image1.dng` are packed into `level1/level2/level3_frames/`.
+
+A frame archive contains the image data of all RAW images in a folder as a
+single memory-mapped array, along with their filenames, ISO speeds, exposure
+times, and timestamps. Analyses that need individual frames can load them
+from the archive with `io.FrameArchive`, without decoding the RAW files again.
+
+Images are assumed to be in the `images` subfolder (see `data_template`).
+
+Command line arguments:
+    * `folder`: folder containing data. Any RAW images in this folder and any
+    of its subfolders will be packed, as described above.
+"""
+
+from sys import argv
+from spectacle import io
+from os import walk
+
+# Get the data folder from the command line
+folder = io.path_from_input(argv)
+root = io.find_root_folder(folder)
+
+# Get the camera metadata
+camera = io.load_metadata(root)
+print("Loaded metadata")
+
+# Wildcard pattern to find RAW data with
+raw_pattern = f"*{camera.image.raw_extension}"
+
+# Walk through the folder and all its subfolders
+for tup in walk(folder):
+    # The current folder
+    folder_here = io.Path(tup[0])
+
+    # If there are no RAW files in this folder, move on to the next
+    if not any(folder_here.glob(raw_pattern)):
+        continue
+
+    # The folder to save the archive to
+    goal = io.replace_word_in_path(folder_here, "images", "stacks")
+    goal = goal.parent/f"{goal.name}_frames"
+
+    # Pack the RAW files in this folder
+    io.pack_raw_frames(folder_here, goal, pattern=raw_pattern)
+
+    # Print the input and output folder as confirmation
+    print(f"{folder_here}  -->  {goal}")
@@ -9,28 +9,58 @@ Images are assumed to be in the `images` subfolder (see `data_template`).
 
 By default, image stacks are saved in the `root/stacks/` folder.
 
-For particularly large data sets, use the `stack_heavy.py` script instead.
+The mean and standard deviation are calculated in a single pass, loading one
+image at a time, so this script can also be used for particularly large data
+sets. For the RAW data, the number of images in which each pixel was saturated
+or an outlier is saved as well, at `level1/level2/level3_saturated.npy` and
+`level1/level2/level3_outliers.npy`.
+
+A manifest of the input files (names, sizes, modification times) is saved with
+each set of stacks, at `level1/level2/level3_manifest.json`. Folders whose
+inputs have not changed since they were last stacked are skipped. The
+sufficient statistics of the mean stacks are saved as well, so if images were
+only added to a folder, only the new images are loaded and added to its stacks.
 
 Command line arguments:
     * `folder`: folder containing data. Any RAW (and optionally JPEG) images in
     this folder and any of its subfolders will be stacked, as described above.
 
+Command line options:
+    * `-f`, `--force`: stack all folders from scratch, even if their stacks are
+    up to date.
+    * `-n`, `--dry-run`: only report which folders would be stacked.
+    * `-c`, `--compression`: losslessly compress the stacks with the given codec
+    (zlib or lzma). Default: `compression` in the SPECTACLE config file.
+    * `-m`, `--method`: stacking method: mean (default), median, sigma_clip,
+    or trimmed. The robust methods are less sensitive to outliers such as
+    cosmic rays, but need temporary disk space for all frames in a folder.
+    * `-t`, `--temporary-folder`: folder for the temporary copies of the frames
+    made by the robust methods. Default: the system temporary folder.
+
 TO DO:
     * Allow input/output folders that are not in `images` or `stacks`
 """
 
-import numpy as np
-from sys import argv
-from spectacle import io
-from os import walk, makedirs
-
-# Get the data folder from the command line
-folder = io.path_from_input(argv)
+from optparse import OptionParser
+from spectacle import io, stacking
+from os import walk
+
+# Get the data folder and options from the command line
+parser = OptionParser(usage="%prog [options] folder")
+parser.add_option("-f", "--force", action="store_true", default=False, help="stack all folders from scratch, even if their stacks are up to date")
+parser.add_option("-n", "--dry-run", action="store_true", default=False, help="only report which folders would be stacked")
+parser.add_option("-c", "--compression", choices=list(io.compression_codecs), default=io.default_compression, help="losslessly compress the stacks with this codec (zlib or lzma)")
+parser.add_option("-m", "--method", choices=["mean", *stacking.robust_methods], default="mean", help="stacking method: mean, median, sigma_clip, or trimmed")
+parser.add_option("-t", "--temporary-folder", default=None, help="folder for temporary copies of the frames made by robust stacking methods")
+options, arguments = parser.parse_args()
+if len(arguments) != 1:
+    parser.error("expected exactly one folder")
+folder = io.Path(arguments[0])
 root = io.find_root_folder(folder)
-print("Loaded metadata")
 
 # Get the camera metadata
 camera = io.load_metadata(root)
+print("Loaded metadata")
 
 # Wildcard pattern to find RAW data with
 raw_pattern = f"*{camera.image.raw_extension}"
@@ -43,42 +73,22 @@ for tup in walk(folder):
     # The folder to save stacks to
     goal = io.replace_word_in_path(folder_here, "images", "stacks")
 
-    # Find all RAW files in this folder
-    raw_files = list(folder_here.glob(raw_pattern))
-    if len(raw_files) == 0:
-        # If there are no RAW files in this folder, move on to the next
+    # If there are no RAW files in this folder, move on to the next
+    if not any(folder_here.glob(raw_pattern)):
         continue
 
-    # Load all RAW files
-    arrs, colors = io.load_raw_image_multi(folder_here, pattern=raw_pattern)
-
-    # Calculate the mean and standard deviation per pixel
-    mean = arrs.mean(axis=0, dtype=np.float32)
-    stds = arrs.std (axis=0, dtype=np.float32)
+    # Skip folders whose stacks are up to date, unless forced
+    if not options.force and stacking.is_up_to_date(folder_here, goal, raw_pattern=raw_pattern, method=options.method):
+        print(f"{folder_here}  (up to date)")
+        continue
 
-    # Create the goal folder if it does not exist yet
-    makedirs(goal.parent, exist_ok=True)
+    # In a dry run, only report what would be stacked
+    if options.dry_run:
+        print(f"{folder_here}  -->  {goal}_x.npy  (would be stacked)")
+        continue
 
-    # Save the RAW data stacks
-    np.save(f"{goal}_mean.npy", mean)
-    np.save(f"{goal}_stds.npy", stds)
+    # Stack the RAW (and JPEG) files in this folder
+    stacking.stack_folder(folder_here, goal, raw_pattern=raw_pattern, compression=options.compression, method=options.method, append=not options.force, saturation=camera.saturation, temporary_folder=options.temporary_folder)
 
     # Print the input and output folder as confirmation
     print(f"{folder_here}  -->  {goal}_x.npy")
-
-    # Find all JPEG files in this folder
-    JPGs = list(folder_here.glob("*.jp*g"))
-    if len(JPGs) == 0:
-        # If there are no JPEG files in this folder, move on to the next
-        continue
-
-    # Load all JPEG files
-    jarrs = io.load_jpg_multi(folder_here)
-
-    # Calculate the mean and standard deviation per pixel
-    jmean = jarrs.mean(axis=0, dtype=np.float32)
-    jstds = jarrs.std (axis=0, dtype=np.float32)
-
-    # Save the JPEG data stacks
-    np.save(f"{goal}_jmean.npy", jmean)
-    np.save(f"{goal}_jstds.npy", jstds)